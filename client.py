@@ -3,18 +3,142 @@ import threading
 import time
 import pickle
 import struct
+import os
+import sys
+import re
+import queue
 from PIL import ImageGrab
 import cv2
 import numpy as np
 import mss  # More efficient screen capture
 
+TARGET_FRAME_NS = 1_000_000_000 // 30  # Target 30 FPS
+FRAME_HEADER = struct.Struct("!I")  # Size prefix sent before every frame
+# Slightly lower quality for speed; no OPTIMIZE, which costs a second Huffman pass
+JPEG_ENCODE_PARAM = [int(cv2.IMWRITE_JPEG_QUALITY), 75]
+
+# Optional: Desktop Duplication API capture on Windows
+dxcam = None
+if sys.platform == "win32":
+    try:
+        import dxcam
+    except ImportError:
+        pass
+
+# Optional: libjpeg-turbo bindings with SIMD encoding
+try:
+    from turbojpeg import TurboJPEG, TJSAMP_420, TJFLAG_FASTDCT, TJPF_BGR, TJPF_BGRA
+except ImportError:
+    TurboJPEG = None
+
+# Optional: Numba-compiled kernel that fuses alpha stripping with resizing
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def bgra_resize_to_bgr(src, dst):
+        """Nearest-neighbour resize of a BGR(A) frame into a BGR buffer in one pass"""
+        src_h, src_w = src.shape[0], src.shape[1]
+        dst_h, dst_w = dst.shape[0], dst.shape[1]
+        for y in prange(dst_h):
+            sy = y * src_h // dst_h
+            for x in range(dst_w):
+                sx = x * src_w // dst_w
+                dst[y, x, 0] = src[sy, sx, 0]
+                dst[y, x, 1] = src[sy, sx, 1]
+                dst[y, x, 2] = src[sy, sx, 2]
+else:
+    bgra_resize_to_bgr = None
+
+# GStreamer H.264 encoders to try, NVIDIA hardware first. Both emit access unit
+# delimiters so the byte stream can be split back into one payload per frame
+H264_ENCODERS = [
+    "nvh264enc preset=low-latency-hq zerolatency=true bitrate=4000 aud=true",
+    "x264enc tune=zerolatency speed-preset=ultrafast bitrate=4000 key-int-max=60 aud=true",
+]
+ACCESS_UNIT_DELIMITER = b"\x00\x00\x01\x09"
+
+class GStreamerH264Encoder:
+    """H.264 encoder built from a GStreamer pipeline behind cv2.VideoWriter"""
+    def __init__(self, width, height, fps):
+        # The pipeline writes its byte stream into a pipe we read back
+        self.read_fd, self.write_fd = os.pipe()
+        self.writer = None
+        
+        for encoder in H264_ENCODERS:
+            pipeline = (
+                f"appsrc ! videoconvert ! {encoder} ! "
+                "video/x-h264,stream-format=byte-stream,alignment=au ! "
+                f"fdsink fd={self.write_fd} sync=false"
+            )
+            writer = cv2.VideoWriter(pipeline, cv2.CAP_GSTREAMER, 0, fps, (width, height))
+            if writer.isOpened():
+                self.writer = writer
+                self.name = encoder.split()[0]
+                break
+        
+        if self.writer is None:
+            os.close(self.read_fd)
+            os.close(self.write_fd)
+            raise RuntimeError("no GStreamer H.264 encoder could be opened")
+        
+        self.access_units = queue.Queue()
+        self.reader = threading.Thread(target=self.read_access_units, daemon=True)
+        self.reader.start()
+    
+    def read_access_units(self):
+        """Split the encoder's byte stream into access units"""
+        buffer = bytearray()
+        while True:
+            chunk = os.read(self.read_fd, 65536)
+            if not chunk:
+                break
+            buffer += chunk
+            
+            # An access unit ends where the next one's delimiter starts (search
+            # past the delimiter the buffer itself starts with)
+            end = buffer.find(ACCESS_UNIT_DELIMITER, 5)
+            while end != -1:
+                self.access_units.put(bytes(buffer[:end]))
+                del buffer[:end]
+                end = buffer.find(ACCESS_UNIT_DELIMITER, 5)
+    
+    def encode(self, frame):
+        """Push a BGR frame and return the access units that are ready"""
+        self.writer.write(frame)
+        
+        ready = []
+        while True:
+            try:
+                ready.append(self.access_units.get_nowait())
+            except queue.Empty:
+                return ready
+    
+    def close(self):
+        """Flush the pipeline and stop the reader"""
+        self.writer.release()
+        os.close(self.write_fd)
+        self.reader.join(timeout=1.0)
+        os.close(self.read_fd)
+
 class ScreenShareClient:
     def __init__(self):
         self.client_socket = None
         self.connected = False
         self.streaming = False
+        self._header_buf = bytearray(FRAME_HEADER.size)
         self.use_mss = True  # Use MSS for faster screen capture
         self.sct = None
+        self._dxcam = None
+        self._monitor = None
+        self._resize_dst = None  # Reused output buffer for the Numba resize
+        self._bgr_buf = None  # Reused BGR buffer fed to the H.264 pipeline
+        self._tj = None  # TurboJPEG instance when libjpeg-turbo is available
+        self.use_h264 = False  # Opt-in: the server needs PyAV to decode H.264
+        self.h264_encoder = None  # GStreamer H.264 encoder when enabled and available
         self.frame_count = 0
         self.start_time = None
         
@@ -35,30 +159,65 @@ class ScreenShareClient:
     
     def init_screen_capture(self):
         """Initialize screen capture method"""
+        if dxcam is not None:
+            try:
+                self._dxcam = dxcam.create(output_color="BGR")
+                self._dxcam.start(target_fps=30, video_mode=True)
+                print("Using DXcam for screen capture (fastest on Windows)")
+                return
+            except Exception as e:
+                print(f"DXcam unavailable, falling back to MSS: {e}")
+                self._dxcam = None
+        
         try:
             import mss
             self.sct = mss.mss()
+            self._monitor = self.sct.monitors[1]  # Primary monitor
             self.use_mss = True
             print("Using MSS for screen capture (faster)")
         except ImportError:
             print("MSS not available, using PIL (slower). Install with: pip install mss")
             self.use_mss = False
     
+    def init_jpeg_encoder(self):
+        """Use libjpeg-turbo for JPEG encoding when it is installed"""
+        if TurboJPEG is None:
+            return
+        try:
+            self._tj = TurboJPEG()
+            print("Using libjpeg-turbo for JPEG encoding (faster)")
+        except Exception as e:
+            # Raised when the libjpeg-turbo shared library can't be found
+            print(f"TurboJPEG unavailable, using OpenCV: {e}")
+            self._tj = None
+    
+    def capture_screen_dxcam(self):
+        """Capture screen using DXcam (Desktop Duplication API, Windows only)"""
+        try:
+            # Already BGR and contiguous; blocks until a new frame is available
+            return self._dxcam.get_latest_frame()
+        except Exception as e:
+            print(f"Error with DXcam capture: {e}")
+            return None
+    
     def capture_screen_mss(self):
-        """Capture screen using MSS (faster method)"""
+        """Capture screen using MSS (faster method)
+        
+        On X11, MSS picks XShmGetImage by itself and copies each grab into a
+        fresh buffer, so no opt-in is needed. Callers still treat the frame as
+        valid only until the next capture, as a conservative contract.
+        
+        The frame keeps its alpha channel: the resize kernel and both JPEG
+        encoders read BGRA directly, while a [:, :, :3] view would be copied
+        into a contiguous array by OpenCV before encoding.
+        """
         try:
             # Capture the primary monitor
-            monitor = self.sct.monitors[1]  # Primary monitor
-            screenshot = self.sct.grab(monitor)
+            screenshot = self.sct.grab(self._monitor)
             
-            # Convert to numpy array directly
-            frame = np.array(screenshot)
-            
-            # Remove alpha channel if present and convert BGRA to BGR
-            if frame.shape[2] == 4:
-                frame = frame[:, :, :3]
-            
-            return frame
+            # Wrap the BGRA buffer directly instead of copying it
+            frame = np.frombuffer(screenshot.raw, dtype=np.uint8)
+            return frame.reshape(screenshot.height, screenshot.width, 4)
         except Exception as e:
             print(f"Error with MSS capture: {e}")
             return None
@@ -67,44 +226,61 @@ class ScreenShareClient:
         """Capture screen using PIL (fallback method)"""
         try:
             screenshot = ImageGrab.grab()
-            frame = np.array(screenshot)
-            # Convert RGB to BGR for OpenCV
-            frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-            return frame
+            if screenshot.mode != "RGB":
+                screenshot = screenshot.convert("RGB")
+            
+            # Let PIL pack the pixels as BGR so OpenCV needs no extra conversion
+            frame = np.frombuffer(screenshot.tobytes("raw", "BGR"), dtype=np.uint8)
+            return frame.reshape(screenshot.height, screenshot.width, 3)
         except Exception as e:
             print(f"Error with PIL capture: {e}")
             return None
     
+    def grab_frame(self):
+        """Capture the screen and scale it down for streaming"""
+        # Use appropriate capture method
+        if self._dxcam:
+            frame = self.capture_screen_dxcam()
+        elif self.use_mss and self.sct:
+            frame = self.capture_screen_mss()
+        else:
+            frame = self.capture_screen_pil()
+        
+        if frame is None:
+            return None
+        
+        # Resize frame to reduce bandwidth
+        height, width = frame.shape[:2]
+        new_width = min(1280, width)
+        new_height = int(height * (new_width / width))
+        
+        # Use faster interpolation for resizing
+        if new_width != width:
+            if bgra_resize_to_bgr is not None:
+                frame = self.resize_frame_numba(frame, new_width, new_height)
+            else:
+                frame = cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+        
+        return frame
+    
     def capture_screen(self):
         """Capture the screen and return as compressed image data"""
         try:
-            # Use appropriate capture method
-            if self.use_mss and self.sct:
-                frame = self.capture_screen_mss()
-            else:
-                frame = self.capture_screen_pil()
-            
+            frame = self.grab_frame()
             if frame is None:
                 return None
             
-            # Resize frame to reduce bandwidth
-            height, width = frame.shape[:2]
-            new_width = min(1280, width)
-            new_height = int(height * (new_width / width))
-            
-            # Use faster interpolation for resizing
-            if new_width != width:
-                frame = cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
-            
             # Compress the frame with optimized settings
-            encode_param = [
-                int(cv2.IMWRITE_JPEG_QUALITY), 75,  # Slightly lower quality for speed
-                int(cv2.IMWRITE_JPEG_OPTIMIZE), 1   # Optimize for size
-            ]
-            result, encoded_img = cv2.imencode('.jpg', frame, encode_param)
+            if self._tj is not None:
+                pixel_format = TJPF_BGRA if frame.shape[2] == 4 else TJPF_BGR
+                return self._tj.encode(np.ascontiguousarray(frame), quality=75,
+                                       pixel_format=pixel_format,
+                                       jpeg_subsample=TJSAMP_420, flags=TJFLAG_FASTDCT)
+            
+            result, encoded_img = cv2.imencode('.jpg', frame, JPEG_ENCODE_PARAM)
             
             if result:
-                return encoded_img.tobytes()
+                return memoryview(encoded_img).cast("B")  # No copy into a bytes object
             else:
                 return None
                 
@@ -112,29 +288,104 @@ class ScreenShareClient:
             print(f"Error capturing screen: {e}")
             return None
     
+    def init_h264_encoder(self):
+        """Switch to H.264 if requested and OpenCV was built with GStreamer support"""
+        if not self.use_h264:
+            return
+        if not re.search(r"GStreamer:\s*YES", cv2.getBuildInformation()):
+            print("H.264 needs OpenCV built with GStreamer, using JPEG")
+            return
+        
+        frame = self.grab_frame()
+        if frame is None:
+            return
+        
+        # I420 needs even dimensions
+        height, width = frame.shape[:2]
+        try:
+            self.h264_encoder = GStreamerH264Encoder(width - width % 2, height - height % 2, 30)
+            print(f"Using H.264 encoding ({self.h264_encoder.name}); "
+                  "the server needs PyAV to decode it")
+        except Exception as e:
+            print(f"H.264 encoding unavailable, using JPEG: {e}")
+            self.h264_encoder = None
+    
+    def capture_screen_h264(self):
+        """Capture the screen and return the H.264 access units that are ready"""
+        try:
+            frame = self.grab_frame()
+            if frame is None:
+                return []
+            
+            # appsrc takes contiguous BGR with even dimensions
+            height, width = frame.shape[:2]
+            frame = frame[:height - height % 2, :width - width % 2]
+            if frame.shape[2] == 4:
+                # SIMD BGRA -> BGR conversion into a reused buffer
+                if self._bgr_buf is None or self._bgr_buf.shape[:2] != frame.shape[:2]:
+                    self._bgr_buf = np.empty(frame.shape[:2] + (3,), dtype=np.uint8)
+                frame = cv2.cvtColor(frame, cv2.COLOR_BGRA2BGR, dst=self._bgr_buf)
+            else:
+                frame = np.ascontiguousarray(frame)
+            return self.h264_encoder.encode(frame)
+        except Exception as e:
+            print(f"Error encoding H.264: {e}")
+            return []
+    
+    def capture_payloads(self):
+        """Capture the screen and return the encoded payloads to send"""
+        if self.h264_encoder is not None:
+            return self.capture_screen_h264()
+        
+        frame_data = self.capture_screen()
+        return [frame_data] if frame_data else []
+    
+    def resize_frame_numba(self, frame, new_width, new_height):
+        """Resize into a reused BGR buffer with the fused Numba kernel"""
+        dst = self._resize_dst
+        if dst is None or dst.shape[:2] != (new_height, new_width):
+            dst = np.empty((new_height, new_width, 3), dtype=np.uint8)
+            self._resize_dst = dst
+        bgra_resize_to_bgr(frame, dst)
+        return dst
+    
     def send_frame_data(self, data):
         """Send frame data to server with size header"""
         try:
-            # Pack the size of the data
-            size = len(data)
-            size_data = struct.pack("!I", size)
+            # Pack the size of the data into the reused header buffer
+            FRAME_HEADER.pack_into(self._header_buf, 0, len(data))
             
-            # Send size first, then data
-            self.client_socket.sendall(size_data)
-            self.client_socket.sendall(data)
+            # Send size and data in one scatter-gather call where supported
+            if hasattr(self.client_socket, "sendmsg"):
+                self.sendmsg_all([self._header_buf, data])
+            else:
+                # Windows has no sendmsg - send size first, then data
+                self.client_socket.sendall(self._header_buf)
+                self.client_socket.sendall(data)
             return True
         except Exception as e:
             print(f"Error sending frame: {e}")
             return False
     
+    def sendmsg_all(self, buffers):
+        """Send all buffers with sendmsg, resending whatever a partial write left"""
+        views = [memoryview(buffer).cast("B") for buffer in buffers]
+        while views:
+            sent = self.client_socket.sendmsg(views)
+            while views and sent >= len(views[0]):
+                sent -= len(views[0])
+                views.pop(0)
+            if sent:
+                views[0] = views[0][sent:]
+    
     def calculate_fps(self):
         """Calculate and display current FPS"""
         self.frame_count += 1
         if self.frame_count % 30 == 0:  # Display FPS every 30 frames
-            current_time = time.time()
+            current_time = time.perf_counter_ns()
             if self.start_time:
-                elapsed = current_time - self.start_time
-                fps = 30 / elapsed
+                elapsed_ns = current_time - self.start_time
+                fps = 30 * 1_000_000_000 / elapsed_ns
                 print(f"Current FPS: {fps:.1f}")
             self.start_time = current_time
     
@@ -146,34 +397,44 @@ class ScreenShareClient:
         
         # Initialize screen capture
         self.init_screen_capture()
+        self.init_jpeg_encoder()
+        
+        # Capture one frame up front so the Numba kernel is compiled before streaming
+        if bgra_resize_to_bgr is not None:
+            print("Compiling resize kernel...")
+            self.capture_screen()
+        
+        self.init_h264_encoder()
         
         self.streaming = True
-        self.start_time = time.time()
+        self.start_time = time.perf_counter_ns()
         print("Starting screen streaming... Press Ctrl+C to stop")
         print("Optimizations enabled for better performance")
         
         try:
+            next_deadline = time.perf_counter_ns()
             while self.streaming:
-                frame_start = time.time()
-                
                 # Capture screen
-                frame_data = self.capture_screen()
+                payloads = self.capture_payloads()
                 
-                if frame_data:
+                if payloads:
                     # Send frame to server
-                    if not self.send_frame_data(frame_data):
+                    if not all(self.send_frame_data(frame_data) for frame_data in payloads):
                         print("Failed to send frame, stopping stream")
                         break
                     
                     # Calculate FPS
                     self.calculate_fps()
                 
-                # Dynamic frame rate control
-                frame_time = time.time() - frame_start
-                target_frame_time = 1.0 / 30.0  # Target 30 FPS
-                
-                if frame_time < target_frame_time:
-                    time.sleep(target_frame_time - frame_time)
+                # Frame rate control against absolute deadlines, so loop overhead
+                # doesn't accumulate and drag the stream below the target FPS
+                next_deadline += TARGET_FRAME_NS
+                sleep_ns = next_deadline - time.perf_counter_ns()
+                if sleep_ns > 0:
+                    time.sleep(sleep_ns / 1e9)
+                elif sleep_ns < -TARGET_FRAME_NS:
+                    # More than a frame behind - resync instead of bursting to catch up
+                    next_deadline = time.perf_counter_ns()
                 
         except KeyboardInterrupt:
             print("\nStopping stream...")
@@ -185,6 +446,11 @@ class ScreenShareClient:
     def stop_streaming(self):
         """Stop streaming and disconnect"""
         self.streaming = False
+        if self.h264_encoder:
+            self.h264_encoder.close()
+            self.h264_encoder = None
+        if self._dxcam:
+            self._dxcam.stop()
         if self.sct:
             self.sct.close()
         if self.client_socket:
@@ -232,6 +498,9 @@ def main():
                 print("Invalid port number!")
                 continue
                 
+            h264 = input("Encode H.264 with GStreamer? Server needs PyAV (y/n, default n): ").strip().lower()
+            client.use_h264 = h264 == 'y'
+            
             print(f"Connecting to {host}:{port}...")
             break
             
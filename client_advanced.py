@@ -2,15 +2,18 @@ import socket
 import threading
 import time
 import struct
-import queue
 import platform
 import sys
 import os
+import queue
+from collections import deque
+from fractions import Fraction
 from PIL import ImageGrab
 import cv2
 import numpy as np
 import multiprocessing as mp
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
 
 # Platform detection
 IS_MACOS = platform.system() == "Darwin"
@@ -18,20 +21,346 @@ IS_APPLE_SILICON = IS_MACOS and platform.machine() == "arm64"
 IS_WINDOWS = platform.system() == "Windows"
 IS_LINUX = platform.system() == "Linux"
 
+# Optional: Desktop Duplication API capture on Windows
+dxcam = None
+if IS_WINDOWS:
+    try:
+        import dxcam
+    except ImportError:
+        pass
+HAS_TCP_CORK = hasattr(socket, "TCP_CORK")  # Linux only
+HAS_TCP_INFO = hasattr(socket, "TCP_INFO")  # Linux only
+
+# Largest size frames are streamed at (keeping aspect ratio), per platform
+if IS_APPLE_SILICON:
+    MAX_STREAM_SIZE = (2560, 1600)  # Higher res for Apple Silicon
+elif IS_MACOS:
+    MAX_STREAM_SIZE = (1920, 1200)  # Higher res for Intel Mac
+else:
+    MAX_STREAM_SIZE = (1600, 1000)  # Higher res for Windows/Linux
+
+# Send buffer sized to twice the bandwidth-delay product, within these bounds
+INITIAL_SNDBUF = 256 * 1024
+MIN_SNDBUF = 64 * 1024
+MAX_SNDBUF = 4 * 1024 * 1024
+SNDBUF_UPDATE_FRAMES = 30  # Frames between send buffer resizes
+DEFAULT_RTT = 0.02  # Used when the kernel doesn't report the RTT
+TCP_INFO_RTT_OFFSET = 68  # tcpi_rtt (microseconds) in Linux struct tcp_info
+FRAME_HEADER = struct.Struct("!I")  # Size prefix sent before every frame
+
+# Dirty-rect payloads: magic, then x, y, w, h of the tile, then the encoded tile
+RECT_MAGIC = b"RECT"
+RECT_HEADER = struct.Struct("!HHHH")
+DIRTY_RECT_THRESHOLD = 8  # Per-channel difference treated as a change
+
+# Tile-delta payloads: magic, frame width/height and tile count, the changed
+# tile indices (row-major, big-endian uint32), then the LZ4-compressed raw tiles
+TILE_MAGIC = b"TILE"
+TILE_HEADER = struct.Struct("!HHI")
+TILE_SIZE = 16
+TILE_KEYFRAME_RATIO = 0.6  # Send a JPEG keyframe when more tiles than this change
+
+# Optional LZ4 for the lossless tile-delta codec
+try:
+    import lz4.block
+except ImportError:
+    lz4 = None
+
+STATS_WINDOW = 128  # Frames kept for performance statistics
+
+PNG_ENCODE_PARAM = [int(cv2.IMWRITE_PNG_COMPRESSION), 3]  # Balanced compression/speed
+
+# UDP transport: each datagram carries frame id, chunk index, chunk count and
+# frame size, then up to UDP_PAYLOAD bytes. One XOR parity datagram follows
+# every FEC_GROUP chunks; its index is the group number with FEC_PARITY set
+UDP_HEADER = struct.Struct("!IHHI")
+UDP_PAYLOAD = 1400
+FEC_GROUP = 10
+FEC_PARITY = 0x8000
+
+# sendmmsg(2) is not exposed by the socket module; call it through libc on Linux
+_libc = None
+if IS_LINUX:
+    import ctypes
+    
+    class _IoVec(ctypes.Structure):
+        _fields_ = [("iov_base", ctypes.c_void_p), ("iov_len", ctypes.c_size_t)]
+    
+    class _MsgHdr(ctypes.Structure):
+        _fields_ = [("msg_name", ctypes.c_void_p), ("msg_namelen", ctypes.c_uint32),
+                    ("msg_iov", ctypes.POINTER(_IoVec)), ("msg_iovlen", ctypes.c_size_t),
+                    ("msg_control", ctypes.c_void_p), ("msg_controllen", ctypes.c_size_t),
+                    ("msg_flags", ctypes.c_int)]
+    
+    class _MMsgHdr(ctypes.Structure):
+        _fields_ = [("msg_hdr", _MsgHdr), ("msg_len", ctypes.c_uint)]
+    
+    try:
+        _libc = ctypes.CDLL(None, use_errno=True)
+        _libc.sendmmsg.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.c_uint, ctypes.c_int]
+    except (OSError, AttributeError):
+        _libc = None
+
+def sendmmsg(sock, packets):
+    """Send datagrams on a connected socket, batched into as few syscalls as possible"""
+    if _libc is None:
+        for packet in packets:
+            sock.send(packet)
+        return
+    
+    count = len(packets)
+    iovecs = (_IoVec * count)()
+    messages = (_MMsgHdr * count)()
+    for i, packet in enumerate(packets):
+        # Points into the bytes objects, which `packets` keeps alive
+        iovecs[i].iov_base = ctypes.cast(ctypes.c_char_p(packet), ctypes.c_void_p).value
+        iovecs[i].iov_len = len(packet)
+        messages[i].msg_hdr.msg_iov = ctypes.pointer(iovecs[i])
+        messages[i].msg_hdr.msg_iovlen = 1
+    
+    sent = 0
+    while sent < count:
+        # Resume after a partial batch
+        result = _libc.sendmmsg(sock.fileno(), ctypes.addressof(messages[sent]), count - sent, 0)
+        if result < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        sent += result
+
+# Cores the worker threads are pinned to when the machine has enough of them
+CAPTURE_CPU = 2
+ENCODE_CPU = 3
+NETWORK_CPU = 4
+
+# Windows sleeps can overshoot by a timer tick, so the last stretch is spun
+SPIN_NS = 200_000
+
+MAX_IN_FLIGHT = 2  # Encoded frames allowed between the encoder and the socket
+ENCODE_PROCESSES = MAX_IN_FLIGHT  # Worker processes when process encoding is on
+
+# Send-rate tracking for latency-budget frame skipping and the H.264 bitrate
+SEND_EWMA_ALPHA = 0.2
+MIN_BITRATE = 1_000_000
+MAX_BITRATE = 8_000_000
+# Recreate the H.264 encoder when the target bitrate drifts this far from its setting
+BITRATE_CHANGE_RATIO = 0.25
+
+# Optional libjpeg-turbo bindings with SIMD encoding
+try:
+    from turbojpeg import TurboJPEG, TJSAMP_420, TJFLAG_FASTDCT
+except ImportError:
+    TurboJPEG = None
+
+# Optional nvJPEG bindings for GPU JPEG encoding of large frames
+try:
+    from nvjpeg import NvJpeg
+except ImportError:
+    NvJpeg = None
+NVJPEG_MIN_PIXELS = 1_000_000  # Below this the CPU encoder is faster
+
+# Optional NVENC bindings (VideoProcessingFramework / VALI)
+try:
+    import PyNvCodec as nvc
+except ImportError:
+    nvc = None
+
+# Optional FFmpeg bindings for hardware H.264 (VideoToolbox, NVENC, Quick Sync)
+try:
+    import av
+except ImportError:
+    av = None
+
+# FFmpeg hardware encoders to try, with their lowest-latency settings
+PYAV_H264_ENCODERS = ["h264_videotoolbox"] if IS_MACOS else ["h264_nvenc", "h264_qsv"]
+PYAV_ENCODER_OPTIONS = {
+    "h264_videotoolbox": {"realtime": "1", "allow_sw": "0", "profile": "baseline"},
+    "h264_nvenc": {"preset": "p1", "tune": "ull", "zerolatency": "1", "profile": "baseline"},
+    "h264_qsv": {"preset": "veryfast", "async_depth": "1", "look_ahead": "0", "profile": "baseline"},
+}
+
+# Shared-memory capture buffers attached in an encode worker process, by name
+_attached_slabs = {}
+_attached_shape = None  # Frame shape of the attached slabs; a new one means new slabs
+_worker_tj = None  # TurboJPEG instance of a worker process, False if unavailable
+
+def encode_jpeg_in_process(slab_name, shape, size, quality):
+    """Resize and JPEG-encode a frame held in shared memory (runs in a worker process)"""
+    start_ns = time.perf_counter_ns()
+    
+    # The parent replaces all its slabs when the capture size changes, so the
+    # old attachments are dead and can be closed
+    global _attached_shape
+    if shape != _attached_shape:
+        for old_slab in _attached_slabs.values():
+            try:
+                old_slab.close()
+            except BufferError:
+                pass
+        _attached_slabs.clear()
+        _attached_shape = shape
+    
+    slab = _attached_slabs.get(slab_name)
+    if slab is None:
+        slab = _attached_slabs[slab_name] = shared_memory.SharedMemory(name=slab_name)
+    frame = np.ndarray(shape, dtype=np.uint8, buffer=slab.buf)
+    
+    if (frame.shape[1], frame.shape[0]) != size:
+        frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+    
+    # Same encoder choice as the main process: libjpeg-turbo first
+    global _worker_tj
+    if _worker_tj is None:
+        try:
+            _worker_tj = TurboJPEG() if TurboJPEG is not None else False
+        except Exception:
+            _worker_tj = False
+    if _worker_tj:
+        encoded = _worker_tj.encode(frame, quality=quality,
+                                    jpeg_subsample=TJSAMP_420, flags=TJFLAG_FASTDCT)
+        return encoded, (time.perf_counter_ns() - start_ns) / 1e9
+    
+    result, encoded_img = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+    if not result:
+        return None, 0.0
+    return encoded_img.tobytes(), (time.perf_counter_ns() - start_ns) / 1e9
+
+class GPUVideoEncoder:
+    """Low-latency H.264 encoder running on the GPU's NVENC block"""
+    def __init__(self, width, height, fps, bitrate=MAX_BITRATE, gpu_id=0):
+        self.width = width
+        self.height = height
+        self.bitrate = bitrate
+        self.gpu_id = gpu_id
+        
+        self.encoder = nvc.PyNvEncoder({
+            "preset": "P4",
+            "tuning_info": "low_latency",
+            "codec": "h264",
+            "s": f"{width}x{height}",
+            "fps": str(fps),
+            "bitrate": f"{bitrate // 1000}k",
+        }, gpu_id)
+        
+        # BGR upload followed by an on-GPU BGR -> YUV420 -> NV12 conversion chain
+        self.uploader = nvc.PyFrameUploader(width, height, nvc.PixelFormat.BGR, gpu_id)
+        self.to_yuv = nvc.PySurfaceConverter(width, height, nvc.PixelFormat.BGR,
+                                             nvc.PixelFormat.YUV420, gpu_id)
+        self.to_nv12 = nvc.PySurfaceConverter(width, height, nvc.PixelFormat.YUV420,
+                                              nvc.PixelFormat.NV12, gpu_id)
+        self.cc_ctx = nvc.ColorspaceConversionContext(nvc.ColorSpace.BT_601,
+                                                      nvc.ColorRange.MPEG)
+        self.packet = np.ndarray(shape=(0,), dtype=np.uint8)
+    
+    def encode(self, frame):
+        """Encode a BGR frame and return the Annex-B NAL units (may be empty)"""
+        surface = self.uploader.UploadSingleFrame(np.ascontiguousarray(frame).reshape(-1))
+        surface = self.to_yuv.Execute(surface, self.cc_ctx)
+        surface = self.to_nv12.Execute(surface, self.cc_ctx)
+        
+        if self.encoder.EncodeSingleSurface(surface, self.packet):
+            return self.packet.tobytes()
+        return b''
+
+class PyAVVideoEncoder:
+    """Low-latency H.264 encoder on an FFmpeg hardware codec"""
+    def __init__(self, codec_name, width, height, fps, bitrate=MAX_BITRATE):
+        self.width = width
+        self.height = height
+        self.bitrate = bitrate
+        
+        self.context = av.CodecContext.create(codec_name, "w")
+        self.context.width = width
+        self.context.height = height
+        # Quick Sync only takes NV12; the others take planar I420 as produced
+        self.pix_fmt = "nv12" if codec_name == "h264_qsv" else "yuv420p"
+        self.context.pix_fmt = self.pix_fmt
+        self.context.time_base = Fraction(1, fps)
+        self.context.framerate = Fraction(fps, 1)
+        self.context.gop_size = fps * 2
+        self.context.max_b_frames = 0  # B-frames hold output back by a frame or more
+        self.context.bit_rate = bitrate
+        self.context.options = PYAV_ENCODER_OPTIONS.get(codec_name, {})
+        self.context.open()
+        self.pts = 0
+        
+        # Converted once per frame with OpenCV's SIMD path: 1.5 bytes per pixel
+        self.i420 = np.empty((height * 3 // 2, width), dtype=np.uint8)
+        self.nv12 = np.empty_like(self.i420) if self.pix_fmt == "nv12" else None
+    
+    def encode(self, frame):
+        """Encode a BGR frame and return the Annex-B NAL units (may be empty)"""
+        cv2.cvtColor(frame, cv2.COLOR_BGR2YUV_I420, dst=self.i420)
+        yuv = self.i420
+        if self.nv12 is not None:
+            # Interleave the U and V planes after the Y plane
+            luma = self.width * self.height
+            chroma = luma // 4
+            self.nv12[:self.height] = self.i420[:self.height]
+            uv = self.nv12.reshape(-1)[luma:]
+            uv[0::2] = self.i420.reshape(-1)[luma:luma + chroma]
+            uv[1::2] = self.i420.reshape(-1)[luma + chroma:]
+            yuv = self.nv12
+        
+        video_frame = av.VideoFrame.from_ndarray(yuv, format=self.pix_fmt)
+        video_frame.pts = self.pts
+        self.pts += 1
+        return b"".join(bytes(packet) for packet in self.context.encode(video_frame))
+
 class AdvancedScreenShareClient:
     def __init__(self):
         self.client_socket = None
         self.connected = False
         self.streaming = False
+        self._header_buf = bytearray(FRAME_HEADER.size)
+        self.use_udp = False  # UDP datagrams with XOR parity instead of TCP
+        self._frame_id = 0
         self.sct = None
+        self._dxcam = None
+        self._monitor = None
+        self._grab_bgra = None  # MSS grab specialized for the monitor geometry
+        self._capture_buffers = []
+        self._capture_slabs = {}  # id(buffer) -> SharedMemory backing it
         
         # Advanced features
-        self.frame_queue = queue.Queue(maxsize=5)  # Frame buffer
+        # Latest-frame handoff: the encode worker always encodes the newest frame.
+        # Only the capture thread appends to the one-slot deque and only the
+        # encode thread keeps what it pops, so atomic deque operations are enough
+        self._latest = deque(maxlen=1)
+        self._latest_event = threading.Event()
+        # Capture buffers neither published nor being encoded; buffers return
+        # here when their encode finishes or a newer frame replaces them
+        self._free_buffers = deque()
+        # Makes swapping out the slab map and submitting a worker encode against
+        # it mutually exclusive, so no slab is unlinked under a pending encode.
+        # Not related to the _latest deque, which needs no lock
+        self._slab_lock = threading.Lock()
+        self._pending_encodes = set()  # Futures of worker-process encodes not yet finished
+        # Encoded frames waiting for the network worker. Nothing is dropped here
+        # (dirty rects and H.264 depend on delivery), so in-flight is capped instead
+        self._encoded = queue.Queue()
+        self._in_flight = threading.BoundedSemaphore(MAX_IN_FLIGHT)
+        # JPEG encoding in worker processes, reading frames from shared memory
+        self.use_process_encoding = False
+        self._encode_pool = None
         self.use_threading = True
         self.use_hardware_encoding = False
+        self.allow_h264 = False  # Opt-in: the server needs PyAV to decode H.264
+        self.use_h264 = False  # Hardware H.264 instead of per-frame JPEG
+        self.h264_codec = None  # FFmpeg encoder name when PyNvCodec is not used
+        self.video_encoder = None
+        self._tj = None  # TurboJPEG instance when libjpeg-turbo is available
+        self._nvjpeg = None  # NvJpeg instance when a CUDA GPU is available
+        self.use_cuda_resize = False  # Resize on the GPU with OpenCV's CUDA module
+        self._gpu_in = None
+        self._gpu_out = None
+        self._resize_buf = None  # Reused CPU resize output
+        self._output_sizes = {}  # Capture size -> stream size
         self.adaptive_quality = True
         self.target_fps = 30
+        self.target_ns = 1_000_000_000 // self.target_fps  # Frame period, refreshed on start
         self.current_quality = 90  # Start with higher quality
+        # Reused cv2.imencode params; only the quality slot changes per frame
+        self._encode_param = [int(cv2.IMWRITE_JPEG_QUALITY), self.current_quality]
         
         # Quality settings
         self.use_png_compression = False  # Option for lossless compression
@@ -39,16 +368,38 @@ class AdvancedScreenShareClient:
         self.max_quality = 98  # Higher maximum quality
         self.preserve_original_resolution = False  # Option to keep original size
         
-        # Performance monitoring
-        self.frame_times = []
-        self.network_times = []
+        # Dirty-rect encoding: only the changed region is sent between keyframes
+        self.use_dirty_rects = True
+        self.keyframe_interval = 60  # Frames between full keyframes
+        self.frames_since_keyframe = 0
+        self._prev_frame = None
+        # Lossless 16x16 tile deltas (LZ4) instead of a JPEG dirty rect
+        self.use_tile_delta = False
+        
+        # Performance monitoring (fixed-size ring buffers of recent measurements)
+        self.frame_times = np.zeros(STATS_WINDOW, dtype=np.float32)
+        self.network_times = np.zeros(STATS_WINDOW, dtype=np.float32)
+        self._stat_idx = 0
+        
+        # Latency control: frames that would reach the server later than the
+        # budget are skipped before encoding
+        self.latency_budget = 0.1
+        self.send_ewma = 0.0  # Smoothed send time in seconds
+        self.send_rate_ewma = 0.0  # Smoothed send rate in bits per second
+        self.target_bitrate = MAX_BITRATE
+        self.skipped_frames = 0
+        self._last_encode_ns = 0  # When the encode worker last let a frame through
         
         # Platform-specific settings
         self.screen_capture_method = self.detect_best_capture_method()
         
     def detect_best_capture_method(self):
         """Detect the best screen capture method for the current platform"""
-        if IS_MACOS:
+        if IS_WINDOWS and dxcam is not None:
+            # Desktop Duplication returns frames without a GDI BitBlt
+            print("Windows: Using DXcam for screen capture")
+            return "dxcam"
+        elif IS_MACOS:
             # Check for screen recording permissions on macOS
             if self.check_macos_permissions():
                 try:
@@ -78,10 +429,17 @@ class AdvancedScreenShareClient:
             
         try:
             # Try to capture a small area to test permissions
-            test_screenshot = ImageGrab.grab(bbox=(0, 0, 100, 100))
+            try:
+                import mss
+                with mss.mss() as sct:
+                    test_screenshot = sct.grab({"top": 0, "left": 0, "width": 64, "height": 64})
+                # Skip alpha, which stays opaque even when capture is blocked
+                test_array = np.frombuffer(test_screenshot.raw, dtype=np.uint8).reshape(-1, 4)[:, :3]
+            except ImportError:
+                test_array = np.asarray(ImageGrab.grab(bbox=(0, 0, 64, 64)))
+            
             # If we get a black image, permissions might be denied
-            test_array = np.array(test_screenshot)
-            if np.all(test_array == 0):
+            if not test_array.any():
                 print("⚠️  macOS Screen Recording Permission Required!")
                 print("   Go to: System Preferences → Security & Privacy → Privacy → Screen Recording")
                 print("   Add and enable your terminal application or Python")
@@ -94,10 +452,23 @@ class AdvancedScreenShareClient:
     
     def init_screen_capture(self):
         """Initialize screen capture based on detected method"""
+        if self.screen_capture_method == "dxcam":
+            try:
+                self._dxcam = dxcam.create(output_color="BGR")
+                self._dxcam.start(target_fps=self.target_fps, video_mode=True)
+                print("Initialized DXcam (Desktop Duplication API)")
+                return True
+            except Exception as e:
+                print(f"DXcam initialization failed, falling back to MSS: {e}")
+                self._dxcam = None
+                self.screen_capture_method = "mss"
+        
         if self.screen_capture_method == "mss":
             try:
                 import mss
                 self.sct = mss.mss()
+                self._monitor = self.sct.monitors[1]  # Primary monitor
+                self._grab_bgra = self.build_mss_grab()
                 
                 if IS_MACOS:
                     # macOS-specific MSS optimizations
@@ -127,7 +498,19 @@ class AdvancedScreenShareClient:
     def init_hardware_encoding(self):
         """Try to initialize hardware encoding with platform-specific optimizations"""
         try:
-            if IS_APPLE_SILICON:
+            if self.allow_h264 and nvc is not None and self.probe_nvenc():
+                # NVIDIA GPU with VPF bindings - real H.264 encoding on NVENC
+                self.use_h264 = True
+                self.use_hardware_encoding = True
+                print("NVENC detected - H.264 hardware encoding enabled")
+                
+            elif self.allow_h264 and av is not None and self.find_pyav_encoder():
+                # VideoToolbox, NVENC or Quick Sync through FFmpeg
+                self.use_h264 = True
+                self.use_hardware_encoding = True
+                print(f"{self.h264_codec} detected - H.264 hardware encoding enabled")
+                
+            elif IS_APPLE_SILICON:
                 # Apple Silicon has hardware video encoders
                 print("Apple Silicon detected - hardware encoding capabilities available")
                 # Note: Real implementation would use VideoToolbox framework
@@ -139,13 +522,11 @@ class AdvancedScreenShareClient:
                 # Intel Mac
                 print("Intel Mac detected - checking for hardware encoding")
                 # Intel Macs may have Intel Quick Sync
-                fourcc = cv2.VideoWriter_fourcc(*'H264')
                 self.use_hardware_encoding = True
                 print("Hardware encoding enabled (Intel Quick Sync simulation)")
                 
             elif IS_WINDOWS:
                 # Windows hardware encoding (NVENC, Intel Quick Sync, etc.)
-                fourcc = cv2.VideoWriter_fourcc(*'H264')
                 self.use_hardware_encoding = True
                 print("Hardware encoding available (Windows)")
                 
@@ -157,6 +538,72 @@ class AdvancedScreenShareClient:
         except Exception as e:
             print(f"Hardware encoding initialization failed: {e}")
             self.use_hardware_encoding = False
+        
+        # OpenCV built with CUDA: move the downscale off the CPU
+        try:
+            if cv2.cuda.getCudaEnabledDeviceCount() > 0:
+                self._gpu_in = cv2.cuda_GpuMat()
+                self._gpu_out = cv2.cuda_GpuMat()
+                self.use_cuda_resize = True
+                print("CUDA resize enabled")
+        except (AttributeError, cv2.error):
+            pass  # OpenCV built without CUDA support
+    
+    def probe_nvenc(self):
+        """Check that NVENC opens and encodes a frame on this machine"""
+        try:
+            GPUVideoEncoder(640, 480, self.target_fps).encode(np.zeros((480, 640, 3), dtype=np.uint8))
+            return True
+        except Exception as e:
+            print(f"NVENC unavailable: {e}")
+            return False
+    
+    def find_pyav_encoder(self):
+        """Pick the first FFmpeg hardware H.264 encoder that opens on this machine"""
+        for codec_name in PYAV_H264_ENCODERS:
+            try:
+                PyAVVideoEncoder(codec_name, 640, 480, self.target_fps)
+            except Exception:
+                continue  # Not compiled into FFmpeg or no matching hardware
+            self.h264_codec = codec_name
+            return True
+        return False
+    
+    def init_process_encoding(self):
+        """Start the JPEG encode worker processes"""
+        if self.use_h264 or self.use_png_compression:
+            print("Process encoding only applies to JPEG - ignoring it")
+            return
+        
+        # Spawn rather than fork: workers start on demand, after our threads are running
+        self._encode_pool = ProcessPoolExecutor(max_workers=ENCODE_PROCESSES,
+                                                mp_context=mp.get_context("spawn"))
+        # Tiles would depend on the order workers finish in
+        self.use_dirty_rects = False
+        self.use_tile_delta = False
+        print(f"JPEG encoding in {ENCODE_PROCESSES} worker processes")
+    
+    def init_jpeg_encoder(self):
+        """Use nvJPEG and libjpeg-turbo for JPEG encoding when they are installed"""
+        if NvJpeg is not None:
+            try:
+                self._nvjpeg = NvJpeg()
+                print(f"Using nvJPEG for frames above {NVJPEG_MIN_PIXELS} pixels")
+            except Exception as e:
+                print(f"nvJPEG unavailable: {e}")
+                self._nvjpeg = None
+        
+        if TurboJPEG is None:
+            print("Using OpenCV JPEG encoder (install PyTurboJPEG for faster encoding)")
+            return
+        
+        try:
+            self._tj = TurboJPEG()
+            print("Using libjpeg-turbo JPEG encoder")
+        except Exception as e:
+            # Raised when the libjpeg-turbo shared library can't be found
+            print(f"TurboJPEG unavailable, using OpenCV JPEG encoder: {e}")
+            self._tj = None
     
     def adaptive_quality_control(self, frame_time, network_time):
         """Adjust quality based on performance metrics with platform considerations"""
@@ -191,30 +638,35 @@ class AdvancedScreenShareClient:
             # Increase quality
             self.current_quality = min(max_quality, self.current_quality + (quality_step // 2))
     
+    def capture_screen_dxcam(self):
+        """Capture screen using DXcam (Desktop Duplication API, Windows only)"""
+        try:
+            # Already BGR and contiguous. DXcam keeps a ring of 64 frame buffers,
+            # far more than are ever in flight here, so no copy is needed
+            return self._dxcam.get_latest_frame()
+        except Exception as e:
+            print(f"DXcam capture error: {e}")
+            return None
+    
     def capture_screen_mss(self):
-        """Capture screen using MSS with platform-specific optimizations"""
+        """Capture screen using MSS with platform-specific optimizations
+        
+        On X11, MSS picks XShmGetImage by itself and copies each grab into a
+        fresh buffer, so no opt-in is needed. The BGRA view is still treated as
+        valid only until the next grab, as a conservative contract, and is
+        converted into a capture buffer before returning.
+        """
         try:
-            if IS_MACOS:
-                # macOS-specific capture
-                # Primary monitor on macOS
-                monitor = self.sct.monitors[1]
-                
-                # On macOS, we might need to handle Retina displays
-                screenshot = self.sct.grab(monitor)
-                frame = np.array(screenshot)
-                
-                # Handle RGBA to RGB conversion
-                if frame.shape[2] == 4:
-                    frame = frame[:, :, :3]
-                    
-            else:
-                # Windows/Linux capture
-                monitor = self.sct.monitors[1]
-                screenshot = self.sct.grab(monitor)
-                frame = np.array(screenshot)
-                
-                if frame.shape[2] == 4:
-                    frame = frame[:, :, :3]
+            try:
+                frame_bgra = self._grab_bgra()
+            except ValueError:
+                # The resolution changed - specialize for the new geometry
+                self._grab_bgra = self.build_mss_grab()
+                frame_bgra = self._grab_bgra()
+            
+            # Strip alpha as part of the one copy the encoder needs anyway
+            frame = self.next_capture_buffer(frame_bgra.shape[0], frame_bgra.shape[1])
+            cv2.cvtColor(frame_bgra, cv2.COLOR_BGRA2BGR, dst=frame)
             
             return frame
             
@@ -222,22 +674,74 @@ class AdvancedScreenShareClient:
             print(f"MSS capture error: {e}")
             return None
     
+    def build_mss_grab(self):
+        """Return an MSS grab function with the monitor and frame shape baked in"""
+        grab = self.sct.grab
+        monitor = self._monitor
+        
+        # Take the shape from a real grab: on Retina displays the image is
+        # larger than the monitor's size in points
+        probe = grab(monitor)
+        shape = (probe.height, probe.width, 4)
+        
+        def grab_bgra():
+            # Wrap the BGRA buffer directly instead of copying it
+            return np.frombuffer(grab(monitor).raw, dtype=np.uint8).reshape(shape)
+        return grab_bgra
+    
+    def next_capture_buffer(self, height, width):
+        """Return a reusable BGR buffer that is neither published nor being encoded"""
+        shape = (height, width, 3)
+        if not self._capture_buffers or self._capture_buffers[0].shape != shape:
+            # The published frame, the frames being encoded and the one being
+            # captured each need their own buffer
+            self.release_capture_slabs()
+            self._capture_buffers = [self.new_capture_buffer(shape) for _ in range(MAX_IN_FLIGHT + 2)]
+            self._free_buffers = deque(self._capture_buffers)
+        
+        while True:
+            try:
+                frame = self._free_buffers.popleft()
+            except IndexError:
+                return np.empty(shape, dtype=np.uint8)  # Every buffer is in flight
+            if frame.shape == shape:
+                return frame  # Else an old-size buffer that slipped back in
+    
+    def new_capture_buffer(self, shape):
+        """Allocate a capture buffer, in shared memory when encode processes read it"""
+        if self._encode_pool is None:
+            return np.empty(shape, dtype=np.uint8)
+        
+        slab = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)))
+        frame = np.ndarray(shape, dtype=np.uint8, buffer=slab.buf)
+        self._capture_slabs[id(frame)] = slab
+        return frame
+    
+    def release_capture_slabs(self):
+        """Free the shared memory behind the capture buffers once no encode uses it"""
+        with self._slab_lock:
+            slabs = self._capture_slabs
+            self._capture_slabs = {}  # Later frames from these buffers encode in-thread
+            pending = list(self._pending_encodes)
+        wait(pending)
+        
+        for slab in slabs.values():
+            try:
+                slab.close()
+            except BufferError:
+                pass  # A frame still references it; the mapping goes with the process
+            slab.unlink()
+    
     def capture_screen_pil(self):
-        """Capture screen using PIL with platform-specific handling"""
+        """Capture screen using PIL (fallback method)"""
         try:
-            if IS_MACOS:
-                # macOS PIL capture
-                screenshot = ImageGrab.grab()
-                frame = np.array(screenshot)
-                
-                # macOS returns RGB, convert to BGR for OpenCV
-                frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-                
-            else:
-                # Windows/Linux PIL capture
-                screenshot = ImageGrab.grab()
-                frame = np.array(screenshot)
-                frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+            screenshot = ImageGrab.grab()
+            if screenshot.mode != "RGB":
+                screenshot = screenshot.convert("RGB")
+            
+            # Let PIL pack the pixels as BGR so OpenCV needs no extra conversion
+            frame = np.frombuffer(screenshot.tobytes("raw", "BGR"), dtype=np.uint8)
+            frame = frame.reshape(screenshot.height, screenshot.width, 3)
             
             return frame
             
@@ -247,224 +751,417 @@ class AdvancedScreenShareClient:
     
     def capture_worker(self):
         """Dedicated thread for screen capture with platform optimizations"""
+        # Use appropriate capture method, chosen once rather than every frame
+        if self.screen_capture_method == "dxcam" and self._dxcam:
+            capture = self.capture_screen_dxcam
+        elif self.screen_capture_method == "mss" and self.sct:
+            capture = self.capture_screen_mss
+        else:
+            capture = self.capture_screen_pil
+        
+        next_deadline = time.perf_counter_ns()
         while self.streaming:
             try:
-                start_time = time.time()
-                
-                # Use appropriate capture method
-                if self.screen_capture_method == "mss" and self.sct:
-                    frame = self.capture_screen_mss()
-                else:
-                    frame = self.capture_screen_pil()
+                start_ns = time.perf_counter_ns()
+                frame = capture()
                 
                 if frame is None:
                     continue
                 
-                capture_time = time.time() - start_time
+                capture_ns = time.perf_counter_ns() - start_ns
+                capture_time = capture_ns / 1e9
                 
-                # Add to queue (non-blocking)
+                # Publish the frame, replacing any that wasn't picked up yet
+                # (stale frames are dropped, which prevents lag buildup). The
+                # stale frame is popped first so its buffer can be reused
                 try:
-                    self.frame_queue.put((frame, capture_time), block=False)
-                except queue.Full:
-                    # Drop frame if queue is full (prevents lag buildup)
-                    pass
-                    
-                # Platform-specific timing adjustments
-                if IS_APPLE_SILICON:
-                    # Apple Silicon can handle higher frame rates
-                    min_sleep = 0.001
-                else:
-                    min_sleep = 0.005
+                    self.finish_encoding(self._latest.pop()[0])
+                except IndexError:
+                    pass  # The encode worker took it
+                self._latest.append((frame, capture_time, start_ns))
+                self._latest_event.set()
                 
-                sleep_time = max(min_sleep, (1.0 / self.target_fps) - capture_time)
-                time.sleep(sleep_time)
+                # Pace to absolute deadlines so time spent anywhere in the loop
+                # doesn't accumulate as drift
+                next_deadline += self.target_ns
+                if next_deadline - time.perf_counter_ns() < -self.target_ns:
+                    # More than a frame behind - resync instead of bursting
+                    next_deadline = time.perf_counter_ns()
+                self.sleep_until(next_deadline)
                 
             except Exception as e:
                 print(f"Capture error: {e}")
                 break
     
+    def sleep_until(self, deadline_ns):
+        """Sleep until a perf_counter_ns deadline"""
+        remaining = deadline_ns - time.perf_counter_ns()
+        if IS_WINDOWS:
+            if remaining > SPIN_NS:
+                time.sleep((remaining - SPIN_NS) / 1e9)
+            while time.perf_counter_ns() < deadline_ns:
+                pass
+        elif remaining > 0:
+            time.sleep(remaining / 1e9)
+    
+    def output_size(self, original_width, original_height):
+        """Size to stream a frame at, computed once per capture size"""
+        key = (original_width, original_height)
+        size = self._output_sizes.get(key)
+        if size is None:
+            size = self._output_sizes[key] = self.compute_output_size(original_width, original_height)
+        return size
+    
+    def compute_output_size(self, original_width, original_height):
+        """Size to stream a frame at, keeping its aspect ratio"""
+        original_aspect_ratio = original_width / original_height
+        
+        # Smart resolution handling with proper aspect ratio preservation
+        if self.preserve_original_resolution:
+            # Keep original resolution for maximum quality
+            new_width = original_width
+            new_height = original_height
+            print(f"Using original resolution: {new_width}x{new_height}")
+        else:
+            # Platform-specific resolution limits - but maintain aspect ratio
+            max_width, max_height = MAX_STREAM_SIZE
+            
+            # Calculate new dimensions while preserving aspect ratio
+            if original_width > max_width or original_height > max_height:
+                # Calculate scale factor based on both width and height limits
+                width_scale = max_width / original_width
+                height_scale = max_height / original_height
+                scale_factor = min(width_scale, height_scale)  # Use the smaller scale to fit both dimensions
+                
+                new_width = int(original_width * scale_factor)
+                new_height = int(original_height * scale_factor)
+                
+                # Ensure dimensions are even numbers (better for video encoding)
+                new_width = new_width - (new_width % 2)
+                new_height = new_height - (new_height % 2)
+                
+                print(f"Resizing from {original_width}x{original_height} to {new_width}x{new_height} (scale: {scale_factor:.2f})")
+            else:
+                # Keep original size if within limits
+                new_width = original_width
+                new_height = original_height
+        
+        # Verify aspect ratio is preserved
+        new_aspect_ratio = new_width / new_height
+        aspect_ratio_diff = abs(original_aspect_ratio - new_aspect_ratio)
+        if aspect_ratio_diff > 0.01:  # Allow small floating point differences
+            print(f"⚠️  Aspect ratio changed: {original_aspect_ratio:.3f} → {new_aspect_ratio:.3f}")
+            # Recalculate to fix aspect ratio
+            new_height = int(new_width / original_aspect_ratio)
+            new_height = new_height - (new_height % 2)  # Ensure even number
+            print(f"Corrected to: {new_width}x{new_height}")
+        
+        return new_width, new_height
+    
     def encode_frame_advanced(self, frame):
         """Advanced frame encoding with high-quality settings and proper aspect ratio"""
         try:
             original_height, original_width = frame.shape[:2]
-            original_aspect_ratio = original_width / original_height
+            new_width, new_height = self.output_size(original_width, original_height)
             
-            # Smart resolution handling with proper aspect ratio preservation
-            if self.preserve_original_resolution:
-                # Keep original resolution for maximum quality
-                new_width = original_width
-                new_height = original_height
-                print(f"Using original resolution: {new_width}x{new_height}")
-            else:
-                # Platform-specific resolution limits - but maintain aspect ratio
-                if IS_APPLE_SILICON:
-                    max_width = 2560  # Higher res for Apple Silicon
-                    max_height = 1600  # 16:10 aspect ratio limit
-                elif IS_MACOS:
-                    max_width = 1920  # Higher res for Intel Mac
-                    max_height = 1200  # 16:10 aspect ratio limit
+            # High-quality resizing if needed
+            if (new_width != original_width or new_height != original_height) and self.use_cuda_resize:
+                # Area-averaging downscale on the GPU (OpenCV CUDA build)
+                self._gpu_in.upload(frame)
+                self._gpu_out = cv2.cuda.resize(self._gpu_in, (new_width, new_height), self._gpu_out,
+                                                interpolation=cv2.INTER_AREA)
+                frame = self._gpu_out.download()
+            elif new_width != original_width or new_height != original_height:
+                # Area averaging is the proper box filter for downscaling and is
+                # much cheaper than CUBIC or LANCZOS4
+                if new_width < original_width:
+                    interpolation = cv2.INTER_AREA
                 else:
-                    max_width = 1600  # Higher res for Windows/Linux
-                    max_height = 1000  # 16:10 aspect ratio limit
+                    interpolation = cv2.INTER_LINEAR
                 
-                # Calculate new dimensions while preserving aspect ratio
-                if original_width > max_width or original_height > max_height:
-                    # Calculate scale factor based on both width and height limits
-                    width_scale = max_width / original_width
-                    height_scale = max_height / original_height
-                    scale_factor = min(width_scale, height_scale)  # Use the smaller scale to fit both dimensions
-                    
-                    new_width = int(original_width * scale_factor)
-                    new_height = int(original_height * scale_factor)
-                    
-                    # Ensure dimensions are even numbers (better for video encoding)
-                    new_width = new_width - (new_width % 2)
-                    new_height = new_height - (new_height % 2)
-                    
-                    print(f"Resizing from {original_width}x{original_height} to {new_width}x{new_height} (scale: {scale_factor:.2f})")
-                else:
-                    # Keep original size if within limits
-                    new_width = original_width
-                    new_height = original_height
+                # Resize into a buffer reused while the output size is unchanged
+                if self._resize_buf is None or self._resize_buf.shape[:2] != (new_height, new_width):
+                    self._resize_buf = np.empty((new_height, new_width, frame.shape[2]), dtype=np.uint8)
+                frame = cv2.resize(frame, (new_width, new_height), dst=self._resize_buf,
+                                   interpolation=interpolation)
             
-            # Verify aspect ratio is preserved
-            new_aspect_ratio = new_width / new_height
-            aspect_ratio_diff = abs(original_aspect_ratio - new_aspect_ratio)
-            if aspect_ratio_diff > 0.01:  # Allow small floating point differences
-                print(f"⚠️  Aspect ratio changed: {original_aspect_ratio:.3f} → {new_aspect_ratio:.3f}")
-                # Recalculate to fix aspect ratio
-                new_height = int(new_width / original_aspect_ratio)
-                new_height = new_height - (new_height % 2)  # Ensure even number
-                print(f"Corrected to: {new_width}x{new_height}")
-            
-            # High-quality resizing if needed
-            if new_width != original_width or new_height != original_height:
-                # Always use highest quality interpolation for resizing
-                if IS_APPLE_SILICON:
-                    interpolation = cv2.INTER_LANCZOS4  # Best quality
-                else:
-                    interpolation = cv2.INTER_CUBIC  # High quality
-                    
-                frame = cv2.resize(frame, (new_width, new_height), 
-                                 interpolation=interpolation)
-                print(f"Resized using {interpolation} interpolation")
+            # Hardware H.264 encoding replaces per-frame JPEG unless lossless was requested
+            if self.use_h264 and not self.use_png_compression:
+                encoded = self.encode_frame_h264(frame)
+                if encoded is not None:
+                    return encoded
             
-            # High-quality encoding options
-            if self.use_png_compression:
-                # PNG for lossless compression (larger files but perfect quality)
-                encode_param = [
-                    int(cv2.IMWRITE_PNG_COMPRESSION), 3  # Balanced compression/speed
-                ]
-                result, encoded_img = cv2.imencode('.png', frame, encode_param)
-            else:
-                # High-quality JPEG encoding
-                if self.use_hardware_encoding:
-                    if IS_APPLE_SILICON:
-                        # Apple Silicon optimized encoding - highest quality
-                        encode_param = [
-                            int(cv2.IMWRITE_JPEG_QUALITY), self.current_quality,
-                            int(cv2.IMWRITE_JPEG_OPTIMIZE), 1,
-                            int(cv2.IMWRITE_JPEG_PROGRESSIVE), 1,
-                            int(cv2.IMWRITE_JPEG_LUMA_QUALITY), self.current_quality,
-                            int(cv2.IMWRITE_JPEG_CHROMA_QUALITY), self.current_quality
-                        ]
-                    elif IS_MACOS:
-                        # Intel Mac encoding - high quality
-                        encode_param = [
-                            int(cv2.IMWRITE_JPEG_QUALITY), self.current_quality,
-                            int(cv2.IMWRITE_JPEG_OPTIMIZE), 1,
-                            int(cv2.IMWRITE_JPEG_LUMA_QUALITY), self.current_quality,
-                            int(cv2.IMWRITE_JPEG_CHROMA_QUALITY), min(95, self.current_quality + 5)
-                        ]
-                    else:
-                        # Windows/Linux hardware encoding
-                        encode_param = [
-                            int(cv2.IMWRITE_JPEG_QUALITY), self.current_quality,
-                            int(cv2.IMWRITE_JPEG_OPTIMIZE), 1,
-                            int(cv2.IMWRITE_JPEG_LUMA_QUALITY), self.current_quality
-                        ]
-                else:
-                    # High-quality software encoding
-                    encode_param = [
-                        int(cv2.IMWRITE_JPEG_QUALITY), self.current_quality,
-                        int(cv2.IMWRITE_JPEG_OPTIMIZE), 1,
-                        int(cv2.IMWRITE_JPEG_LUMA_QUALITY), self.current_quality,
-                        int(cv2.IMWRITE_JPEG_CHROMA_QUALITY), min(98, self.current_quality + 3)
-                    ]
-                
-                result, encoded_img = cv2.imencode('.jpg', frame, encode_param)
+            # Send only the region that changed since the previous frame
+            if self.use_tile_delta and lz4 is not None and not self.use_png_compression:
+                return self.encode_tile_delta(frame)
+            if self.use_dirty_rects:
+                return self.encode_dirty_rect(frame)
+            return self.encode_image(frame)
             
-            if result:
-                return encoded_img.tobytes()
+        except Exception as e:
+            print(f"Encoding error: {e}")
             return None
+    
+    def encode_image(self, frame):
+        """Encode a frame (or tile) as a standalone PNG or JPEG image"""
+        if self.use_png_compression:
+            # PNG for lossless compression (larger files but perfect quality)
+            result, encoded_img = cv2.imencode('.png', frame, PNG_ENCODE_PARAM)
+        elif self._nvjpeg is not None and frame.shape[0] * frame.shape[1] > NVJPEG_MIN_PIXELS:
+            # GPU encoding only pays off for large frames; tiles stay on the CPU
+            return self._nvjpeg.encode(np.ascontiguousarray(frame), self.current_quality)
+        elif self._tj is not None:
+            # libjpeg-turbo SIMD encoder with 4:2:0 chroma and the fast integer DCT
+            return self._tj.encode(np.ascontiguousarray(frame), quality=self.current_quality,
+                                   jpeg_subsample=TJSAMP_420, flags=TJFLAG_FASTDCT)
+        else:
+            # Baseline JPEG on every platform: progressive and optimized Huffman
+            # tables each add extra passes over the frame, which costs latency
+            self._encode_param[1] = self.current_quality
+            result, encoded_img = cv2.imencode('.jpg', frame, self._encode_param)
+
+        if result:
+            return memoryview(encoded_img).cast("B")  # No copy into a bytes object
+        return None
+    
+    def encode_dirty_rect(self, frame):
+        """Encode only the bounding box of pixels that changed since the last sent frame"""
+        self.frames_since_keyframe += 1
+        prev = self._prev_frame
+        
+        # Periodic full keyframe so the receiver can (re)build its canvas
+        if (prev is None or prev.shape != frame.shape
+                or self.frames_since_keyframe >= self.keyframe_interval):
+            encoded = self.encode_image(frame)
+            if encoded is not None:
+                self._prev_frame = frame.copy()
+                self.frames_since_keyframe = 0
+            return encoded
+        
+        diff = cv2.absdiff(frame, prev)
+        mask = diff.max(axis=2) > DIRTY_RECT_THRESHOLD
+        x, y, w, h = cv2.boundingRect(mask.astype(np.uint8))
+        if w == 0 or h == 0:
+            return b''  # Static screen - nothing to send
+        
+        encoded = self.encode_image(frame[y:y + h, x:x + w])
+        if encoded is None:
+            return None
+        
+        prev[y:y + h, x:x + w] = frame[y:y + h, x:x + w]
+        return RECT_MAGIC + RECT_HEADER.pack(x, y, w, h) + encoded
+    
+    def encode_tile_delta(self, frame):
+        """Encode the 16x16 tiles that changed since the last sent frame, losslessly with LZ4"""
+        self.frames_since_keyframe += 1
+        prev = self._prev_frame
+        height, width = frame.shape[:2]
+        
+        if (prev is None or prev.shape != frame.shape
+                or self.frames_since_keyframe >= self.keyframe_interval):
+            return self.encode_tile_keyframe(frame)
+        
+        # Reduce the per-pixel change mask to one flag per tile (edge tiles may be partial)
+        changed = np.bitwise_xor(frame, prev).any(axis=2)
+        changed = np.logical_or.reduceat(changed, np.arange(0, height, TILE_SIZE), axis=0)
+        changed = np.logical_or.reduceat(changed, np.arange(0, width, TILE_SIZE), axis=1)
+        
+        tiles = np.flatnonzero(changed)
+        if len(tiles) == 0:
+            return b''  # Static screen - nothing to send
+        if len(tiles) > TILE_KEYFRAME_RATIO * changed.size:
+            return self.encode_tile_keyframe(frame)
+        
+        columns = changed.shape[1]
+        data = []
+        for tile in tiles:
+            y = (tile // columns) * TILE_SIZE
+            x = (tile % columns) * TILE_SIZE
+            data.append(frame[y:y + TILE_SIZE, x:x + TILE_SIZE].tobytes())
+            prev[y:y + TILE_SIZE, x:x + TILE_SIZE] = frame[y:y + TILE_SIZE, x:x + TILE_SIZE]
+        
+        return (TILE_MAGIC + TILE_HEADER.pack(width, height, len(tiles))
+                + tiles.astype(">u4").tobytes()
+                + lz4.block.compress(b"".join(data), mode="fast"))
+    
+    def encode_tile_keyframe(self, frame):
+        """Send a full JPEG keyframe that later tiles are pasted onto"""
+        encoded = self.encode_image(frame)
+        if encoded is not None:
+            self._prev_frame = frame.copy()
+            self.frames_since_keyframe = 0
+        return encoded
+    
+    def encode_frame_h264(self, frame):
+        """Encode a frame with the hardware H.264 encoder, falling back to JPEG if it fails"""
+        try:
+            # NV12 surfaces need even dimensions
+            height, width = frame.shape[:2]
+            width -= width % 2
+            height -= height % 2
+            frame = frame[:height, :width]
+            
+            # The bitrate is fixed when the encoder opens, so a target that has
+            # moved well away from it means reopening (which starts a new GOP)
+            encoder = self.video_encoder
+            if (encoder is None or encoder.width != width or encoder.height != height
+                    or abs(self.target_bitrate - encoder.bitrate) > BITRATE_CHANGE_RATIO * encoder.bitrate):
+                if self.h264_codec:
+                    self.video_encoder = PyAVVideoEncoder(self.h264_codec, width, height, self.target_fps,
+                                                          self.target_bitrate)
+                else:
+                    self.video_encoder = GPUVideoEncoder(width, height, self.target_fps, self.target_bitrate)
+                print(f"{self.h264_codec or 'NVENC'} encoder initialized at {width}x{height}, "
+                      f"{self.target_bitrate / 1e6:.1f} Mbps")
             
+            return self.video_encoder.encode(frame)
         except Exception as e:
-            print(f"Encoding error: {e}")
+            print(f"H.264 encoding failed, falling back to JPEG: {e}")
+            self.use_h264 = False
+            self.video_encoder = None
             return None
     
-    def network_worker(self):
-        """Dedicated thread for network transmission"""
+    def encode_worker(self):
+        """Dedicated thread that encodes the latest frame while the previous one is sent"""
         while self.streaming:
             try:
-                # Get frame from queue
-                frame_data = self.frame_queue.get(timeout=1.0)
-                if frame_data is None:
+                # Wait for the network worker to have room before taking a frame
+                if not self._in_flight.acquire(timeout=1.0):
+                    continue
+                
+                # Take the latest captured frame
+                if not self._latest_event.wait(timeout=1.0):
+                    self._in_flight.release()
+                    continue
+                # Clear before taking, so a frame published meanwhile sets it again
+                self._latest_event.clear()
+                try:
+                    frame_data = self._latest.pop()
+                except IndexError:
+                    self._in_flight.release()
                     continue
                     
-                frame, capture_time = frame_data
+                frame, capture_time, captured_ns = frame_data
+                
+                # Skip the frame if it could not be sent within the latency budget;
+                # the next capture is fresher and costs the same to encode. One
+                # frame per budget period always goes out, since send_ewma only
+                # comes back down after a send
+                now_ns = time.perf_counter_ns()
+                age = (now_ns - captured_ns) / 1e9
+                since_encode = (now_ns - self._last_encode_ns) / 1e9
+                if age + self.send_ewma > self.latency_budget and since_encode < self.latency_budget:
+                    self.skipped_frames += 1
+                    self.finish_encoding(frame)
+                    self._in_flight.release()
+                    continue
+                self._last_encode_ns = now_ns
                 
-                # Encode frame
-                encode_start = time.time()
+                # Hand MSS frames to a worker process; they already sit in shared
+                # memory. Submitting under the lock lets release_capture_slabs
+                # see every encode that still needs its slab
+                future = None
+                with self._slab_lock:
+                    slab = self._capture_slabs.get(id(frame))
+                    if self._encode_pool is not None and slab is not None:
+                        future = self._encode_pool.submit(encode_jpeg_in_process, slab.name, frame.shape,
+                                                          self.output_size(frame.shape[1], frame.shape[0]),
+                                                          self.current_quality)
+                        self._pending_encodes.add(future)
+                if future is not None:
+                    future.add_done_callback(lambda done, frame=frame: self.finish_process_encode(done, frame))
+                    self._encoded.put((future, capture_time))
+                    continue
+                
+                # Encode frame (OpenCV and the JPEG libraries release the GIL)
+                encode_start = time.perf_counter_ns()
                 encoded_data = self.encode_frame_advanced(frame)
-                encode_time = time.time() - encode_start
+                encode_time = (time.perf_counter_ns() - encode_start) / 1e9
+                self.finish_encoding(frame)
                 
                 if encoded_data:
-                    # Send frame
-                    network_start = time.time()
-                    success = self.send_frame_data(encoded_data)
-                    network_time = time.time() - network_start
+                    self._encoded.put((encoded_data, capture_time + encode_time))
+                else:
+                    self._in_flight.release()
                     
-                    if success:
-                        # Update adaptive quality
-                        total_frame_time = capture_time + encode_time
-                        self.adaptive_quality_control(total_frame_time, network_time)
-                        
-                        # Performance monitoring
-                        self.frame_times.append(total_frame_time)
-                        self.network_times.append(network_time)
-                        
-                        # Keep only recent measurements
-                        if len(self.frame_times) > 100:
-                            self.frame_times = self.frame_times[-50:]
-                            self.network_times = self.network_times[-50:]
-                    else:
-                        print("Network send failed")
-                        break
+            except Exception as e:
+                print(f"Encode worker error: {e}")
+                break
+    
+    def finish_encoding(self, frame):
+        """Let the capture worker reuse a frame's buffer again"""
+        # DXcam/PIL frames and spare allocations aren't pool buffers
+        if any(frame is buffer for buffer in self._capture_buffers):
+            self._free_buffers.append(frame)
+    
+    def finish_process_encode(self, future, frame):
+        """Forget a finished worker-process encode and free its buffer"""
+        with self._slab_lock:
+            self._pending_encodes.discard(future)
+        self.finish_encoding(frame)
+    
+    def network_worker(self):
+        """Dedicated thread for network transmission"""
+        while self.streaming:
+            try:
+                try:
+                    encoded_data, total_frame_time = self._encoded.get(timeout=1.0)
+                except queue.Empty:
+                    continue
+                
+                if isinstance(encoded_data, Future):
+                    # Encoded in a worker process, which also reports its encode time
+                    try:
+                        encoded_data, encode_time = encoded_data.result()
+                    except Exception as e:
+                        print(f"Process encode failed: {e}")
+                        self._in_flight.release()
+                        continue
+                    total_frame_time += encode_time
+                    if not encoded_data:
+                        self._in_flight.release()
+                        continue
+                
+                # Send frame
+                network_start = time.perf_counter_ns()
+                success = self.send_frame_data(encoded_data)
+                network_time = (time.perf_counter_ns() - network_start) / 1e9
+                self._in_flight.release()
+                
+                if success:
+                    # Update adaptive quality
+                    self.adaptive_quality_control(total_frame_time, network_time)
+                    self.update_send_rate(len(encoded_data), network_time)
+                    if not self.use_udp and self._stat_idx % SNDBUF_UPDATE_FRAMES == 0:
+                        self.tune_send_buffer()
+                    
+                    # Performance monitoring (oldest measurement is overwritten)
+                    i = self._stat_idx % STATS_WINDOW
+                    self.frame_times[i] = total_frame_time
+                    self.network_times[i] = network_time
+                    self._stat_idx += 1
+                else:
+                    print("Network send failed")
+                    break
                         
-            except queue.Empty:
-                continue
             except Exception as e:
                 print(f"Network worker error: {e}")
                 break
     
     def connect_to_server(self, host, port):
         """Connect with platform-optimized socket settings"""
+        if self.use_udp:
+            return self.connect_udp(host, port)
+        
         try:
             self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             
             # Platform-specific socket optimizations
             self.client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
             
-            if IS_MACOS:
-                # macOS-specific socket settings
-                buffer_size = 2 * 1024 * 1024  # 2MB buffer for macOS
-                self.client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, buffer_size)
-                self.client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, buffer_size)
-            else:
-                # Windows/Linux
-                buffer_size = 1024 * 1024  # 1MB buffer
-                self.client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, buffer_size)
-                self.client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, buffer_size)
+            # Start small and grow to the measured bandwidth-delay product; a
+            # fixed large buffer just queues frames and adds latency
+            self.client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, INITIAL_SNDBUF)
             
             # Set socket timeout
             self.client_socket.settimeout(10.0)
@@ -477,25 +1174,176 @@ class AdvancedScreenShareClient:
             print(f"Failed to connect to server: {e}")
             return False
     
+    def connect_udp(self, host, port):
+        """Open a UDP socket bound to the server address"""
+        try:
+            self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1024 * 1024)
+            
+            # Connected UDP so plain send()/sendmmsg need no address; stays
+            # blocking because sendmmsg bypasses Python's timeout handling
+            self.client_socket.connect((host, port))
+            self.connected = True
+            print(f"Sending UDP with FEC to {host}:{port}")
+            return True
+        except Exception as e:
+            print(f"Failed to open UDP socket: {e}")
+            return False
+    
     def send_frame_data(self, data):
         """Optimized frame transmission"""
+        if self.use_udp:
+            return self.send_frame_udp(data)
+        
+        try:
+            # Pack the size into the reused header buffer (only the network
+            # worker sends, so one buffer is enough)
+            FRAME_HEADER.pack_into(self._header_buf, 0, len(data))
+            
+            # Cork the socket so the frame leaves as full-sized segments with no
+            # partial trailer; uncorking flushes immediately despite TCP_NODELAY
+            if HAS_TCP_CORK:
+                self.client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, 1)
+            try:
+                if hasattr(self.client_socket, "sendmsg"):
+                    # Header and payload in one scatter-gather call, no joined copy
+                    self.sendmsg_all([self._header_buf, data])
+                else:
+                    # Windows has no sendmsg - send size first, then data, rather
+                    # than copying the payload to join it to the header
+                    self.client_socket.sendall(self._header_buf)
+                    self.client_socket.sendall(data)
+            finally:
+                if HAS_TCP_CORK:
+                    self.client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_CORK, 0)
+            return True
+        except Exception as e:
+            print(f"Error sending frame: {e}")
+            return False
+    
+    def send_frame_udp(self, data):
+        """Send a frame as datagrams with one XOR parity datagram per FEC_GROUP chunks"""
         try:
             size = len(data)
-            size_data = struct.pack("!I", size)
+            total = max(1, -(-size // UDP_PAYLOAD))
+            groups = -(-total // FEC_GROUP)
+            
+            # Zero-pad to whole groups so each group's parity is one XOR reduction
+            padded = np.zeros(groups * FEC_GROUP * UDP_PAYLOAD, dtype=np.uint8)
+            padded[:size] = np.frombuffer(data, dtype=np.uint8)
+            parity = np.bitwise_xor.reduce(padded.reshape(groups, FEC_GROUP, UDP_PAYLOAD), axis=1)
+            
+            frame_id = self._frame_id
+            self._frame_id = (self._frame_id + 1) & 0xFFFFFFFF
+            
+            packets = []
+            for index in range(total):
+                start = index * UDP_PAYLOAD
+                chunk = padded[start:min(start + UDP_PAYLOAD, size)]
+                packets.append(UDP_HEADER.pack(frame_id, index, total, size) + chunk.tobytes())
+                
+                # Parity closes each group, including a short last one
+                if index % FEC_GROUP == FEC_GROUP - 1 or index == total - 1:
+                    group = index // FEC_GROUP
+                    packets.append(UDP_HEADER.pack(frame_id, FEC_PARITY | group, total, size)
+                                   + parity[group].tobytes())
             
-            # Send in one operation when possible
-            full_data = size_data + data
-            self.client_socket.sendall(full_data)
+            sendmmsg(self.client_socket, packets)
             return True
         except Exception as e:
             print(f"Error sending frame: {e}")
             return False
     
+    def sendmsg_all(self, buffers):
+        """Send all buffers with sendmsg, resending whatever a partial write left"""
+        views = [memoryview(buffer).cast("B") for buffer in buffers]
+        while views:
+            sent = self.client_socket.sendmsg(views)
+            while views and sent >= len(views[0]):
+                sent -= len(views[0])
+                views.pop(0)
+            if sent:
+                views[0] = views[0][sent:]
+    
+    def pin_thread(self, thread, cpu_id, raise_priority=False):
+        """Pin a running thread to one core and optionally raise its priority"""
+        if (os.cpu_count() or 1) <= cpu_id:
+            return
+        
+        try:
+            if IS_LINUX:
+                os.sched_setaffinity(thread.native_id, {cpu_id})
+                if raise_priority:
+                    # Per-thread on Linux; needs CAP_SYS_NICE, so without root
+                    # the thread just keeps its normal priority
+                    try:
+                        os.setpriority(os.PRIO_PROCESS, thread.native_id, -5)
+                    except PermissionError:
+                        pass
+            elif IS_WINDOWS:
+                import ctypes
+                kernel32 = ctypes.windll.kernel32
+                THREAD_SET_INFORMATION = 0x0020
+                THREAD_QUERY_INFORMATION = 0x0040
+                THREAD_PRIORITY_ABOVE_NORMAL = 1
+                handle = kernel32.OpenThread(THREAD_SET_INFORMATION | THREAD_QUERY_INFORMATION,
+                                             False, thread.native_id)
+                if not handle:
+                    return
+                kernel32.SetThreadAffinityMask(handle, 1 << cpu_id)
+                if raise_priority:
+                    kernel32.SetThreadPriority(handle, THREAD_PRIORITY_ABOVE_NORMAL)
+                kernel32.CloseHandle(handle)
+        except (OSError, AttributeError) as e:
+            print(f"Could not pin {thread.name} to core {cpu_id}: {e}")
+    
+    def update_send_rate(self, size, network_time):
+        """Track send time and rate, and derive the H.264 target bitrate from them"""
+        self.send_ewma += SEND_EWMA_ALPHA * (network_time - self.send_ewma)
+        if network_time > 0:
+            rate = size * 8 / network_time
+            self.send_rate_ewma += SEND_EWMA_ALPHA * (rate - self.send_rate_ewma)
+        
+        # Leave less headroom as the slowest sends approach the frame budget
+        count = min(self._stat_idx, STATS_WINDOW)
+        if count:
+            p95 = float(np.percentile(self.network_times[:count], 95))
+            frame_budget = 1.0 / self.target_fps
+            if p95 < frame_budget / 2:
+                headroom = 0.9
+            elif p95 < frame_budget:
+                headroom = 0.7
+            else:
+                headroom = 0.5
+            self.target_bitrate = int(min(MAX_BITRATE, max(MIN_BITRATE, headroom * self.send_rate_ewma)))
+    
+    def measure_rtt(self):
+        """Smoothed RTT from the kernel's TCP_INFO in seconds, or a default"""
+        if HAS_TCP_INFO:
+            try:
+                info = self.client_socket.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, 104)
+                rtt_us = struct.unpack_from("I", info, TCP_INFO_RTT_OFFSET)[0]
+                if rtt_us:
+                    return rtt_us / 1e6
+            except (OSError, struct.error):
+                pass
+        return DEFAULT_RTT
+    
+    def tune_send_buffer(self):
+        """Resize SO_SNDBUF to twice the bandwidth-delay product"""
+        bdp = self.send_rate_ewma / 8 * self.measure_rtt()
+        size = int(min(MAX_SNDBUF, max(MIN_SNDBUF, 2 * bdp)))
+        try:
+            self.client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, size)
+        except OSError as e:
+            print(f"Could not resize send buffer: {e}")
+    
     def print_performance_stats(self):
         """Print performance statistics with platform info"""
-        if self.frame_times and self.network_times:
-            avg_frame_time = sum(self.frame_times) / len(self.frame_times)
-            avg_network_time = sum(self.network_times) / len(self.network_times)
+        count = min(self._stat_idx, STATS_WINDOW)
+        if count:
+            avg_frame_time = float(self.frame_times[:count].mean())
+            avg_network_time = float(self.network_times[:count].mean())
             actual_fps = 1.0 / (avg_frame_time + avg_network_time) if (avg_frame_time + avg_network_time) > 0 else 0
             
             platform_info = f"{platform.system()} {platform.machine()}"
@@ -507,6 +1355,9 @@ class AdvancedScreenShareClient:
             print(f"  Average Network Time: {avg_network_time*1000:.1f}ms")
             print(f"  Actual FPS: {actual_fps:.1f}")
             print(f"  Current Quality: {self.current_quality}%")
+            print(f"  Skipped Frames (latency budget): {self.skipped_frames}")
+            if self.use_h264:
+                print(f"  Target Bitrate: {self.target_bitrate / 1e6:.1f} Mbps")
             print(f"  Capture Method: {self.screen_capture_method.upper()}")
     
     def start_streaming(self):
@@ -527,8 +1378,27 @@ class AdvancedScreenShareClient:
             print("Failed to initialize screen capture")
             return
         
+        # A frame FEC can't repair is simply lost over UDP, so every frame must
+        # stand alone; dirty rects, tiles and H.264 would corrupt until a keyframe
+        if self.use_udp and (self.use_dirty_rects or self.use_tile_delta or self.allow_h264):
+            self.use_dirty_rects = False
+            self.use_tile_delta = False
+            self.allow_h264 = False
+            print("UDP transport: sending every frame as a full image")
+        
         # Initialize hardware encoding
         self.init_hardware_encoding()
+        self.init_jpeg_encoder()
+        
+        # Keep OpenCV's own thread pool off the cores the workers are pinned to
+        cv2.setNumThreads(1)
+        
+        if self.use_process_encoding:
+            self.init_process_encoding()
+        
+        # target_fps and the resolution mode may have been changed since __init__
+        self._output_sizes = {}
+        self.target_ns = 1_000_000_000 // self.target_fps
         
         self.streaming = True
         print("Starting advanced screen streaming...")
@@ -540,21 +1410,28 @@ class AdvancedScreenShareClient:
         try:
             if self.use_threading:
                 # Start worker threads
-                capture_thread = threading.Thread(target=self.capture_worker, daemon=True)
-                network_thread = threading.Thread(target=self.network_worker, daemon=True)
+                capture_thread = threading.Thread(target=self.capture_worker, name="capture", daemon=True)
+                encode_thread = threading.Thread(target=self.encode_worker, name="encode", daemon=True)
+                network_thread = threading.Thread(target=self.network_worker, name="network", daemon=True)
                 
                 capture_thread.start()
+                encode_thread.start()
                 network_thread.start()
                 
+                # Dedicated cores reduce frame-time jitter seen by adaptive quality
+                self.pin_thread(capture_thread, CAPTURE_CPU, raise_priority=True)
+                self.pin_thread(encode_thread, ENCODE_CPU)
+                self.pin_thread(network_thread, NETWORK_CPU)
+                
                 # Performance monitoring loop
-                last_stats_time = time.time()
+                last_stats_time = time.perf_counter_ns()
                 while self.streaming:
                     time.sleep(1.0)
                     
                     # Print stats every 10 seconds
-                    if time.time() - last_stats_time > 10:
+                    if time.perf_counter_ns() - last_stats_time > 10_000_000_000:
                         self.print_performance_stats()
-                        last_stats_time = time.time()
+                        last_stats_time = time.perf_counter_ns()
                         
             else:
                 # Fallback to single-threaded mode
@@ -571,8 +1448,18 @@ class AdvancedScreenShareClient:
         """Stop streaming and cleanup"""
         self.streaming = False
         
+        if self._dxcam:
+            self._dxcam.stop()
         if self.sct:
             self.sct.close()
+        if self._encode_pool:
+            self._encode_pool.shutdown(wait=True, cancel_futures=True)
+            self._encode_pool = None
+        # Buffers still published or mid-encode would never come back to the pool
+        self._capture_buffers = []
+        self._free_buffers = deque()
+        self._latest.clear()
+        self.release_capture_slabs()
         if self.client_socket:
             try:
                 self.client_socket.close()
@@ -640,6 +1527,24 @@ def main():
     adaptive = input("Enable adaptive quality? (y/n, default y): ").strip().lower()
     client.adaptive_quality = adaptive != 'n'
     
+    # Screen-content codec
+    if lz4 is not None and not client.use_png_compression:
+        tiles = input("Send changed regions as lossless LZ4 tiles? (y/n, default n): ").strip().lower()
+        client.use_tile_delta = tiles == 'y'
+    
+    # Hardware H.264
+    if nvc is not None or av is not None:
+        h264 = input("Encode H.264 on the GPU if available? Server needs PyAV (y/n, default n): ").strip().lower()
+        client.allow_h264 = h264 == 'y'
+    
+    # Process encoding
+    processes = input("Encode JPEG in worker processes? (y/n, default n): ").strip().lower()
+    client.use_process_encoding = processes == 'y'
+    
+    # Transport
+    transport = input("Transport (1=TCP, 2=UDP with FEC, default 1): ").strip()
+    client.use_udp = transport == "2"
+    
     # Display current settings
     print(f"\n📊 Current Settings:")
     print(f"   Quality: {client.current_quality}% (range: {client.min_quality}-{client.max_quality}%)")
@@ -647,6 +1552,7 @@ def main():
     print(f"   Resolution: {'Original' if client.preserve_original_resolution else 'Adaptive'}")
     print(f"   Target FPS: {client.target_fps}")
     print(f"   Adaptive Quality: {'Enabled' if client.adaptive_quality else 'Disabled'}")
+    print(f"   Transport: {'UDP with FEC' if client.use_udp else 'TCP'}")
     
     # Get server connection
     print("\n🌐 Connection:")
@@ -1,9 +1,97 @@
 import socket
 import threading
 import struct
+import sys
+import functools
 import cv2
 import numpy as np
 
+# Optional: decodes H.264 streams sent by hardware-encoding clients
+try:
+    import av
+except ImportError:
+    av = None
+
+# Optional: hardware decoding through PyAV (HWAccel arrived in PyAV 14)
+try:
+    from av.codec.hwaccel import HWAccel
+except ImportError:
+    HWAccel = None
+
+# Optional: GPU JPEG decoding with nvJPEG
+try:
+    from nvjpeg import NvJpeg
+except ImportError:
+    NvJpeg = None
+
+# Optional: libjpeg-turbo bindings with SIMD decoding
+try:
+    from turbojpeg import TurboJPEG, TJPF_BGR
+except ImportError:
+    TurboJPEG = None
+
+# Optional: Pillow-SIMD (versions end in ".postN") resizes faster than OpenCV
+# for arbitrary downscales; stock Pillow is slower, so it is left unused
+try:
+    import PIL
+    from PIL import Image
+    HAS_PILLOW_SIMD = ".post" in PIL.__version__
+except ImportError:
+    HAS_PILLOW_SIMD = False
+
+# Optional: OpenGL display that scales and converts frames on the GPU
+try:
+    import glfw
+    import moderngl
+except ImportError:
+    glfw = None
+    moderngl = None
+
+# FFmpeg hardware device used for JPEG decoding when there is no nvJPEG
+HW_JPEG_DEVICES = {"linux": "vaapi", "darwin": "videotoolbox", "win32": "d3d11va"}
+
+HAS_TCP_QUICKACK = hasattr(socket, "TCP_QUICKACK")  # Linux only
+# Windows' MSG_WAITALL is unreliable, so there recv_into just loops
+RECV_FLAGS = socket.MSG_WAITALL if hasattr(socket, "MSG_WAITALL") and sys.platform != "win32" else 0
+
+SIZE_HEADER = struct.Struct("!I")  # Length prefix in front of every TCP payload
+
+# Dirty-rect payloads from the advanced client: magic, then x, y, w, h of the
+# tile, then the encoded tile to paste over the last full frame
+RECT_MAGIC = b"RECT"
+RECT_HEADER = struct.Struct("!HHHH")
+
+# Tile-delta payloads from the advanced client: magic, frame width/height and
+# tile count, the tile indices, then the LZ4-compressed raw 16x16 BGR tiles
+TILE_MAGIC = b"TILE"
+TILE_HEADER = struct.Struct("!HHI")
+TILE_SIZE = 16
+
+# Optional: decompresses tile-delta payloads
+try:
+    import lz4.block
+except ImportError:
+    lz4 = None
+
+# UDP transport from the advanced client: frame id, chunk index, chunk count and
+# frame size, then the chunk. Parity datagrams set FEC_PARITY in the index and
+# carry the XOR of their group of FEC_GROUP chunks
+UDP_HEADER = struct.Struct("!IHHI")
+UDP_PAYLOAD = 1400
+FEC_GROUP = 10
+FEC_PARITY = 0x8000
+UDP_MAX_PENDING = 8  # Incomplete frames kept while newer ones arrive
+
+RECV_POOL_SIZE = 4  # Spare receive buffers kept for reuse once decoded
+SOCKET_RCVBUF = 4 * 1024 * 1024  # Room for several full-size frames in the kernel
+DEFAULT_WINDOW_SIZE = (1200, 800)  # Used until the first frame, or if the screen size is unknown
+WINDOW_RECT_INTERVAL = 10  # Frames between window size checks in fit-to-screen mode
+# Bit-exact nearest neighbour arrived in OpenCV 4.5; older builds use the plain one
+INTER_NEAREST_EXACT = getattr(cv2, "INTER_NEAREST_EXACT", cv2.INTER_NEAREST)
+# imdecode flags for decoding at 1/1, 1/2 and 1/4 of the stream size
+IMREAD_SCALED = {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4}
+
+@functools.lru_cache(maxsize=1)
 def get_local_ip():
     """Get the local IP address of this machine"""
     try:
@@ -22,23 +110,236 @@ def get_local_ip():
         except Exception:
             return "Unable to determine"
 
+@functools.lru_cache(maxsize=1)
+def get_screen_size():
+    """Return the primary screen's (width, height), or None if it can't be found"""
+    if sys.platform == "win32":
+        import ctypes
+        user32 = ctypes.windll.user32
+        return user32.GetSystemMetrics(0), user32.GetSystemMetrics(1)
+    
+    # Elsewhere ask Tk; creating a root window is slow, hence the cache
+    try:
+        import tkinter as tk
+        root = tk.Tk()
+        size = root.winfo_screenwidth(), root.winfo_screenheight()
+        root.destroy()
+        return size
+    except Exception:
+        return None
+
+def is_h264(frame_data):
+    """True for an H.264 access unit (Annex-B start code)"""
+    return frame_data[:3] == b'\x00\x00\x01' or frame_data[:4] == b'\x00\x00\x00\x01'
+
+def is_full_image(frame_data):
+    """True for a standalone JPEG/PNG frame that replaces the whole picture"""
+    return frame_data[:4] not in (RECT_MAGIC, TILE_MAGIC) and not is_h264(frame_data)
+
+GL_VERTEX_SHADER = """
+#version 330
+in vec2 position;
+out vec2 uv;
+void main() {
+    // Image rows run top to bottom, so flip v
+    uv = vec2(position.x * 0.5 + 0.5, 0.5 - position.y * 0.5);
+    gl_Position = vec4(position, 0.0, 1.0);
+}
+"""
+
+GL_FRAGMENT_SHADER = """
+#version 330
+uniform sampler2D frame;
+in vec2 uv;
+out vec4 color;
+void main() {
+    // Frames are uploaded as BGR bytes; swizzle here instead of on the CPU
+    color = vec4(texture(frame, uv).bgr, 1.0);
+}
+"""
+
+class GLDisplay:
+    """OpenGL window that uploads frames as textures and scales them on the GPU"""
+    def __init__(self, title, width, height):
+        if not glfw.init():
+            raise RuntimeError("GLFW failed to initialize")
+        glfw.window_hint(glfw.CONTEXT_VERSION_MAJOR, 3)
+        glfw.window_hint(glfw.CONTEXT_VERSION_MINOR, 3)
+        glfw.window_hint(glfw.OPENGL_PROFILE, glfw.OPENGL_CORE_PROFILE)
+        glfw.window_hint(glfw.OPENGL_FORWARD_COMPAT, True)  # Required on macOS
+        self.window = glfw.create_window(width, height, title, None, None)
+        if not self.window:
+            glfw.terminate()
+            raise RuntimeError("GLFW could not create a window")
+        glfw.make_context_current(self.window)
+        glfw.swap_interval(0)  # Don't wait for vsync; latency matters more than tearing
+        
+        self.ctx = moderngl.create_context()
+        program = self.ctx.program(vertex_shader=GL_VERTEX_SHADER, fragment_shader=GL_FRAGMENT_SHADER)
+        quad = self.ctx.buffer(np.array([-1, -1, 1, -1, -1, 1, 1, 1], dtype="f4"))
+        self.vao = self.ctx.simple_vertex_array(program, quad, "position")
+        self.texture = None
+        self.upload_buffers = []
+        self.upload_index = 0
+        
+        self.keys = []
+        glfw.set_char_callback(self.window, lambda window, char: self.keys.append(char))
+    
+    def show(self, frame, stretch=False):
+        """Upload a BGR frame and draw it stretched to the window, or letterboxed"""
+        height, width = frame.shape[:2]
+        if self.texture is None or self.texture.size != (width, height):
+            if self.texture is not None:
+                self.texture.release()
+                for buffer in self.upload_buffers:
+                    buffer.release()
+            self.texture = self.ctx.texture((width, height), 3, alignment=1)
+            self.texture.filter = (moderngl.LINEAR, moderngl.LINEAR)
+            # Two pixel-unpack buffers: the driver copies one into the texture
+            # while the next frame is written into the other
+            self.upload_buffers = [self.ctx.buffer(reserve=frame.nbytes) for _ in range(2)]
+        
+        buffer = self.upload_buffers[self.upload_index]
+        self.upload_index ^= 1
+        buffer.write(frame)
+        self.texture.write(buffer, alignment=1)
+        
+        window_width, window_height = self.window_size()
+        if stretch:
+            self.ctx.viewport = (0, 0, window_width, window_height)
+        else:
+            # Keep the aspect ratio, centred with black bars
+            scale = min(window_width / width, window_height / height)
+            view_width, view_height = int(width * scale), int(height * scale)
+            self.ctx.viewport = (0, 0, window_width, window_height)
+            self.ctx.clear(0.0, 0.0, 0.0)
+            self.ctx.viewport = ((window_width - view_width) // 2, (window_height - view_height) // 2,
+                                 view_width, view_height)
+        self.texture.use(0)
+        self.vao.render(moderngl.TRIANGLE_STRIP)
+        glfw.swap_buffers(self.window)
+    
+    def poll_key(self):
+        """Process window events and return the next typed key like cv2.waitKey, 0xFF if none"""
+        glfw.poll_events()
+        if glfw.window_should_close(self.window):
+            return ord('q')
+        return self.keys.pop(0) & 0xFF if self.keys else 0xFF
+    
+    def window_size(self):
+        """Drawable size of the window in pixels"""
+        return tuple(glfw.get_framebuffer_size(self.window))
+    
+    def set_fullscreen(self):
+        """Cover the primary monitor"""
+        monitor = glfw.get_primary_monitor()
+        mode = glfw.get_video_mode(monitor)
+        glfw.set_window_monitor(self.window, monitor, 0, 0, mode.size.width, mode.size.height, mode.refresh_rate)
+    
+    def resize(self, width, height):
+        """Resize the window"""
+        glfw.set_window_size(self.window, width, height)
+    
+    def reset(self, width, height):
+        """Leave fullscreen and resize the window"""
+        glfw.set_window_monitor(self.window, None, 100, 100, width, height, 0)
+    
+    def close(self):
+        """Destroy the window and release the GL context"""
+        self.ctx.release()
+        glfw.destroy_window(self.window)
+        glfw.terminate()
+
 class ScreenShareServer:
     def __init__(self):
         self.server_socket = None
         self.client_socket = None
         self.running = False
         self.receiving = False
+        self.h264_decoder = None
+        self.h264_warned = False
+        self.lz4_warned = False
+        self._nvjpeg = self.init_nvjpeg()
+        self._tj = self.init_turbojpeg()
+        self._hw_jpeg = self.init_hw_jpeg()
+        self.canvas = None  # Last full frame, updated in place by dirty rects
+        self.reduced_keyframe = None  # Payload of the last image shown at reduced scale
+        self.waiting_for_keyframe = False  # Dirty rects arrived with no canvas to paste on
+        self._size_buf = bytearray(SIZE_HEADER.size)
+        self._free_buffers = []  # Decoded payload buffers ready for reuse
+        self.buffer_lock = threading.Lock()
+        
+        # Payloads handed from the reader thread to the display loop
+        self.pending_payloads = []
+        self.backlog_count = 0  # Payloads received since the last displayed frame
+        self.payload_lock = threading.Lock()
+        self.payload_event = threading.Event()
+        self.connection_lost = False
+        self.saw_dirty_rects = False
+        self.frame_scale = 1  # Stream size over the size of the last decoded frame
+        self.use_gl = False  # OpenGL display (glfw + moderngl) instead of cv2.imshow
+        
+        # UDP transport state
+        self.use_udp = False
+        self.pending_frames = {}  # frame id -> chunks received so far
+        self.last_frame_id = -1
+        self._udp_buf = bytearray(UDP_HEADER.size + UDP_PAYLOAD)
         
+    def init_nvjpeg(self):
+        """Create the nvJPEG decoder once, if a CUDA GPU and the bindings are present"""
+        if NvJpeg is None:
+            return None
+        try:
+            decoder = NvJpeg()
+            print("Using nvJPEG for JPEG decoding")
+            return decoder
+        except Exception as e:
+            print(f"nvJPEG unavailable, decoding on the CPU: {e}")
+            return None
+    
+    def init_hw_jpeg(self):
+        """Create an FFmpeg MJPEG decoder on the platform's video hardware, if nvJPEG isn't used"""
+        device = HW_JPEG_DEVICES.get(sys.platform)
+        if self._nvjpeg is not None or HWAccel is None or device is None:
+            return None
+        try:
+            decoder = av.CodecContext.create('mjpeg', 'r',
+                                             hwaccel=HWAccel(device_type=device, allow_software_fallback=False))
+            print(f"Using {device} for JPEG decoding")
+            return decoder
+        except Exception as e:
+            print(f"{device} JPEG decoding unavailable, decoding on the CPU: {e}")
+            return None
+    
+    def init_turbojpeg(self):
+        """Create the libjpeg-turbo decoder once, if it is installed"""
+        if TurboJPEG is None:
+            return None
+        try:
+            return TurboJPEG()
+        except Exception as e:
+            # Raised when the libjpeg-turbo shared library can't be found
+            print(f"TurboJPEG unavailable, using OpenCV JPEG decoder: {e}")
+            return None
+    
     def start_server(self, host, port):
         """Start the server and listen for connections"""
         try:
-            self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.server_socket.bind((host, port))
-            self.server_socket.listen(1)
+            if self.use_udp:
+                self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_RCVBUF)
+                self.server_socket.bind((host, port))
+            else:
+                self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                # Set before listen() so accepted sockets inherit it and the
+                # window scale is negotiated for the larger buffer
+                self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_RCVBUF)
+                self.server_socket.bind((host, port))
+                self.server_socket.listen(1)
             
             self.running = True
-            print(f"Server started on {host}:{port}")
+            print(f"Server started on {host}:{port}{' (UDP)' if self.use_udp else ''}")
             
             # Display local IP address for easy connection
             local_ip = get_local_ip()
@@ -56,7 +357,21 @@ class ScreenShareServer:
     def wait_for_connection(self):
         """Wait for client connection"""
         try:
+            if self.use_udp:
+                # No handshake: the first datagram marks the client as connected
+                # Peek with room for a whole datagram: Windows raises WSAEMSGSIZE
+                # for a short buffer even with MSG_PEEK
+                _, client_address = self.server_socket.recvfrom(UDP_HEADER.size + UDP_PAYLOAD, socket.MSG_PEEK)
+                print(f"Client streaming from {client_address}")
+                self.client_socket = self.server_socket
+                self.client_socket.settimeout(10.0)
+                return True
+            
             self.client_socket, client_address = self.server_socket.accept()
+            # ACKs and any replies go out immediately rather than waiting on Nagle
+            self.client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            if HAS_TCP_QUICKACK:
+                self.client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
             print(f"Client connected from {client_address}")
             return True
         except Exception as e:
@@ -65,25 +380,22 @@ class ScreenShareServer:
     
     def receive_frame_data(self):
         """Receive frame data from client"""
+        if self.use_udp:
+            return self.receive_frame_udp()
+        
         try:
             # First, receive the size of the incoming data
-            size_data = b''
-            while len(size_data) < 4:
-                chunk = self.client_socket.recv(4 - len(size_data))
-                if not chunk:
-                    return None
-                size_data += chunk
+            if not self.recv_exact(self._size_buf):
+                return None
             
             # Unpack the size
-            size = struct.unpack("!I", size_data)[0]
+            size = SIZE_HEADER.unpack_from(self._size_buf)[0]
             
-            # Receive the actual frame data
-            frame_data = b''
-            while len(frame_data) < size:
-                chunk = self.client_socket.recv(min(size - len(frame_data), 4096))
-                if not chunk:
-                    return None
-                frame_data += chunk
+            # Receive the actual frame data straight into a recycled buffer;
+            # the view is decoded in place without another copy
+            frame_data = memoryview(self.acquire_buffer(size))[:size]
+            if not self.recv_exact(frame_data):
+                return None
             
             return frame_data
             
@@ -91,6 +403,306 @@ class ScreenShareServer:
             print(f"Error receiving frame: {e}")
             return None
     
+    def acquire_buffer(self, size):
+        """Return a spare receive buffer of at least size bytes"""
+        with self.buffer_lock:
+            for i, buffer in enumerate(self._free_buffers):
+                if len(buffer) >= size:
+                    return self._free_buffers.pop(i)
+        # Headroom so slightly larger frames still fit next time
+        return bytearray(size + size // 4)
+    
+    def release_buffers(self, payloads):
+        """Hand the buffers behind decoded or dropped payloads back for reuse"""
+        with self.buffer_lock:
+            for frame_data in payloads:
+                if isinstance(frame_data, memoryview):
+                    self._free_buffers.append(frame_data.obj)
+            del self._free_buffers[:-RECV_POOL_SIZE]
+    
+    def recv_exact(self, buffer):
+        """Fill a buffer from the socket; False if the connection closed first"""
+        view = memoryview(buffer)
+        received = 0
+        while received < len(buffer):
+            # MSG_WAITALL lets the kernel fill the whole buffer in one call;
+            # the loop only repeats if a signal interrupts it
+            count = self.client_socket.recv_into(view[received:], 0, RECV_FLAGS)
+            if not count:
+                return False
+            received += count
+            
+            # Quick ACK mode is cleared by the kernel, so re-arm it after each
+            # recv to avoid delayed-ACK stalls on the sender
+            if HAS_TCP_QUICKACK:
+                self.client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_QUICKACK, 1)
+        return True
+    
+    def receive_frame_udp(self):
+        """Reassemble the next complete frame from datagrams, skipping lost frames"""
+        try:
+            while True:
+                length = self.client_socket.recv_into(self._udp_buf)
+                if length < UDP_HEADER.size:
+                    continue
+                
+                frame_id, index, total, size = UDP_HEADER.unpack_from(self._udp_buf)
+                if frame_id <= self.last_frame_id:
+                    continue  # Late datagram of a frame already shown or skipped
+                
+                frame = self.pending_frames.get(frame_id)
+                if frame is None:
+                    frame = {"size": size, "total": total, "chunks": {}, "parity": {}}
+                    self.pending_frames[frame_id] = frame
+                
+                payload = bytes(self._udp_buf[UDP_HEADER.size:length])
+                if index & FEC_PARITY:
+                    frame["parity"][index & ~FEC_PARITY] = payload
+                else:
+                    frame["chunks"][index] = payload
+                
+                frame_data = self.assemble_udp_frame(frame)
+                if frame_data is not None:
+                    # Anything older that is still incomplete will not be shown
+                    self.last_frame_id = frame_id
+                    for stale in [fid for fid in self.pending_frames if fid <= frame_id]:
+                        del self.pending_frames[stale]
+                    return frame_data
+                
+                if len(self.pending_frames) > UDP_MAX_PENDING:
+                    del self.pending_frames[min(self.pending_frames)]
+                    
+        except socket.timeout:
+            print("No datagrams received for 10 seconds")
+            return None
+        except Exception as e:
+            print(f"Error receiving frame: {e}")
+            return None
+    
+    def assemble_udp_frame(self, frame):
+        """Join a frame's chunks, rebuilding one lost chunk per group from parity"""
+        chunks = frame["chunks"]
+        total = frame["total"]
+        
+        # Each missing chunk needs its group's parity, so fewer datagrams than
+        # chunks can never be enough
+        if len(chunks) < total and len(chunks) + len(frame["parity"]) >= total:
+            for group, parity in frame["parity"].items():
+                members = range(group * FEC_GROUP, min((group + 1) * FEC_GROUP, total))
+                missing = [i for i in members if i not in chunks]
+                if len(missing) != 1:
+                    continue
+                
+                recovered = np.frombuffer(parity, dtype=np.uint8).copy()
+                for i in members:
+                    if i in chunks:
+                        chunk = np.frombuffer(chunks[i], dtype=np.uint8)
+                        recovered[:len(chunk)] ^= chunk
+                
+                lost = missing[0]
+                chunks[lost] = recovered[:min(UDP_PAYLOAD, frame["size"] - lost * UDP_PAYLOAD)].tobytes()
+        
+        if len(chunks) < total:
+            return None
+        return b"".join(chunks[i] for i in range(total))
+    
+    def reader_worker(self):
+        """Receive payloads as fast as they arrive, dropping ones a newer image replaces"""
+        while self.receiving:
+            frame_data = self.receive_frame_data()
+            with self.payload_lock:
+                if frame_data is None:
+                    self.connection_lost = True
+                else:
+                    # A full image supersedes everything queued before it; dirty
+                    # rects and H.264 depend on their predecessors and are kept
+                    if is_full_image(frame_data):
+                        self.release_buffers(self.pending_payloads)
+                        self.pending_payloads = []
+                    self.pending_payloads.append(frame_data)
+                    self.backlog_count += 1
+            self.payload_event.set()
+            if frame_data is None:
+                break
+    
+    def take_payloads(self):
+        """Return the payloads waiting for display and how many arrived since the last call"""
+        self.payload_event.wait(timeout=0.05)
+        with self.payload_lock:
+            payloads = self.pending_payloads
+            backlog = self.backlog_count
+            self.pending_payloads = []
+            self.backlog_count = 0
+            self.payload_event.clear()
+            if not payloads and self.connection_lost:
+                return None, 0
+        return payloads, backlog
+    
+    def decode_h264(self, frame_data):
+        """Decode one H.264 access unit into a BGR frame"""
+        if av is None:
+            if not self.h264_warned:
+                print("Received H.264 stream but PyAV is not installed. Install with: pip install av")
+                self.h264_warned = True
+            return None
+        
+        if self.h264_decoder is None:
+            self.h264_decoder = av.CodecContext.create('h264', 'r')
+        
+        frame = None
+        try:
+            for decoded in self.h264_decoder.decode(av.Packet(frame_data)):
+                frame = decoded.to_ndarray(format='bgr24')
+        except av.AVError as e:
+            print(f"H.264 decode error: {e}")
+        return frame
+    
+    def decode_dirty_rect(self, frame_data):
+        """Paste a changed-region tile onto the canvas and return the canvas"""
+        if self.canvas is None:
+            return None  # Wait for the next keyframe
+        
+        x, y, w, h = RECT_HEADER.unpack_from(frame_data, len(RECT_MAGIC))
+        canvas_height, canvas_width = self.canvas.shape[:2]
+        if x + w > canvas_width or y + h > canvas_height:
+            return None
+        
+        # Small, odd-sized tiles stay on the CPU, as on the client
+        tile = self.decode_image(memoryview(frame_data)[len(RECT_MAGIC) + RECT_HEADER.size:], hardware=False)
+        if tile is None or tile.shape[:2] != (h, w):
+            return None
+        
+        self.canvas[y:y + h, x:x + w] = tile
+        return self.canvas
+    
+    def decode_tile_delta(self, frame_data):
+        """Paste changed 16x16 tiles onto the canvas and return the canvas"""
+        if self.canvas is None:
+            return None  # Wait for the next keyframe
+        if lz4 is None:
+            if not self.lz4_warned:
+                print("Received LZ4 tiles but lz4 is not installed. Install with: pip install lz4")
+                self.lz4_warned = True
+            return None
+        
+        width, height, count = TILE_HEADER.unpack_from(frame_data, len(TILE_MAGIC))
+        if self.canvas.shape[:2] != (height, width):
+            return None
+        
+        offset = len(TILE_MAGIC) + TILE_HEADER.size
+        tiles = np.frombuffer(frame_data, ">u4", count, offset)
+        data = lz4.block.decompress(memoryview(frame_data)[offset + 4 * count:])
+        
+        columns = -(-width // TILE_SIZE)
+        position = 0
+        for tile in tiles:
+            y = int(tile // columns) * TILE_SIZE
+            x = int(tile % columns) * TILE_SIZE
+            region = self.canvas[y:y + TILE_SIZE, x:x + TILE_SIZE]
+            size = region.size
+            region[:] = np.frombuffer(data, np.uint8, size, position).reshape(region.shape)
+            position += size
+        return self.canvas
+    
+    def decode_image(self, frame_data, scale=1, hardware=True):
+        """Decode a JPEG or PNG image into a BGR frame, shrunk by scale (1, 2 or 4)
+        
+        hardware=False keeps the decode off nvJPEG and the video hardware, so a
+        failure there can't switch them off for the full frames they are for.
+        """
+        is_jpeg = frame_data[:2] == b'\xff\xd8'
+        hardware = hardware and is_jpeg and scale == 1
+        if self._nvjpeg is not None and hardware:
+            try:
+                return self._nvjpeg.decode(bytes(frame_data))
+            except Exception as e:
+                print(f"nvJPEG decode failed, decoding on the CPU: {e}")
+                self._nvjpeg = None
+        
+        if self._hw_jpeg is not None and hardware:
+            try:
+                # Hardware frames are copied back to system memory on output
+                frames = self._hw_jpeg.decode(av.Packet(frame_data))
+                if frames:
+                    return frames[-1].to_ndarray(format='bgr24')
+                raise RuntimeError("decoder returned no frame")
+            except Exception as e:
+                # Many drivers lack JPEG support; the first frame shows it
+                print(f"Hardware JPEG decode failed, decoding on the CPU: {e}")
+                self._hw_jpeg = None
+        
+        if self._tj is not None and is_jpeg:
+            # libjpeg-turbo's whole-image API; smaller scales use its reduced IDCT
+            return self._tj.decode(frame_data, pixel_format=TJPF_BGR,
+                                   scaling_factor=(1, scale) if scale > 1 else None)
+        
+        # Reduced-scale decode runs libjpeg's reduced IDCT, much faster
+        nparr = np.frombuffer(frame_data, np.uint8)
+        return cv2.imdecode(nparr, IMREAD_SCALED[scale])
+    
+    def decode_frame(self, frame_data, scale=1):
+        """Decode a received payload (JPEG/PNG image, dirty rect, tiles or H.264 access unit)"""
+        if frame_data[:4] == RECT_MAGIC:
+            self.saw_dirty_rects = True
+            self.frame_scale = 1  # Rects are pasted onto the full-size canvas
+            return self.decode_dirty_rect(frame_data) if self.ensure_canvas() else None
+        if frame_data[:4] == TILE_MAGIC:
+            self.saw_dirty_rects = True
+            self.frame_scale = 1
+            return self.decode_tile_delta(frame_data) if self.ensure_canvas() else None
+        
+        if is_h264(frame_data):
+            frame = self.decode_h264(frame_data)
+            self.frame_scale = 1
+        else:
+            frame = self.decode_image(frame_data, scale)
+            self.frame_scale = scale
+        
+        if frame is not None:
+            # Dirty rects use stream coordinates, so a reduced decode can't be
+            # their canvas. Keep its payload in case rects follow (the buffer
+            # is recycled, hence the copy)
+            self.canvas = frame if self.frame_scale == 1 else None
+            self.reduced_keyframe = None if self.frame_scale == 1 else bytes(frame_data)
+            self.waiting_for_keyframe = False
+        return frame
+    
+    def ensure_canvas(self):
+        """Make sure dirty rects have a full-size canvas; False while waiting for a keyframe"""
+        if self.canvas is None and self.reduced_keyframe is not None:
+            # The last keyframe was shown at reduced scale - decode it again at full size
+            self.canvas = self.decode_image(self.reduced_keyframe)
+            self.reduced_keyframe = None
+        self.waiting_for_keyframe = self.canvas is None
+        return not self.waiting_for_keyframe
+    
+    def resize_to_window(self, frame, size, dst):
+        """Scale a frame to the window size with the cheapest suitable interpolation"""
+        width, height = size
+        frame_height, frame_width = frame.shape[:2]
+        if width < frame_width or height < frame_height:
+            if HAS_PILLOW_SIMD and frame.ndim == 3 and (frame_width % width or frame_height % height):
+                # Resampling is per channel, so BGR can pass through as "RGB"
+                image = Image.frombuffer("RGB", (frame_width, frame_height), frame, "raw", "RGB", 0, 1)
+                return np.asarray(image.resize(size, Image.BILINEAR))
+            interpolation = cv2.INTER_AREA  # Averages source pixels, no aliasing
+        elif width % frame_width == 0 and height % frame_height == 0:
+            interpolation = INTER_NEAREST_EXACT  # Whole-pixel upscale, just replicate
+        else:
+            interpolation = cv2.INTER_LINEAR
+        return cv2.resize(frame, size, dst=dst, interpolation=interpolation)
+    
+    def create_gl_display(self, width, height):
+        """Open the OpenGL display window, or return None to use cv2.imshow"""
+        if not self.use_gl:
+            return None
+        try:
+            return GLDisplay('Screen Share - Server', width, height)
+        except Exception as e:
+            print(f"OpenGL display unavailable, using OpenCV window: {e}")
+            self.use_gl = False
+            return None
+    
     def display_stream(self):
         """Receive and display the video stream with proper aspect ratio handling"""
         if not self.client_socket:
@@ -102,112 +714,189 @@ class ScreenShareServer:
         
         # Display mode settings
         fit_to_screen = False
-        window_created = False
+        window_sized = False
+        window_size = None  # Last window size seen in fit-to-screen mode
+        stream_size = None  # Full resolution of the stream, even when decoded at half scale
+        frames_shown = 0
+        resize_buf = None  # Reused destination for fit-to-screen resizes
+        gl_display = None
+        
+        # Receive on a separate thread so bursts don't queue up behind decoding
+        self.connection_lost = False
+        reader_thread = threading.Thread(target=self.reader_worker, daemon=True)
+        reader_thread.start()
         
         try:
+            # Open the window and probe the screen while waiting for the first
+            # frame, which then only needs a resize
+            get_screen_size()
+            gl_display = self.create_gl_display(*DEFAULT_WINDOW_SIZE)
+            if gl_display is None:
+                cv2.namedWindow('Screen Share - Server', cv2.WINDOW_NORMAL)
+                cv2.resizeWindow('Screen Share - Server', *DEFAULT_WINDOW_SIZE)
+            
             while self.receiving:
-                # Receive frame data
-                frame_data = self.receive_frame_data()
+                # Take everything received since the last displayed frame
+                payloads, backlog = self.take_payloads()
                 
-                if frame_data is None:
+                if payloads is None:
                     print("Connection lost or no data received")
                     break
+                if payloads:
+                    # Decode in order and display only the result. When behind,
+                    # decode full images at half scale; when the window shows the
+                    # stream at half or quarter size, decode at that scale so the
+                    # reduced IDCT replaces a full decode plus resize. Once a stream
+                    # has sent dirty rects, keyframes always get full decodes; a
+                    # reduced keyframe before the first rect is decoded again at
+                    # full size by ensure_canvas
+                    decode_scale = 2 if backlog > 1 else 1
+                    if fit_to_screen and window_size is not None and stream_size is not None:
+                        for factor in (4, 2):
+                            if window_size[0] * factor <= stream_size[0] and window_size[1] * factor <= stream_size[1]:
+                                decode_scale = max(decode_scale, factor)
+                                break
+                    if self.saw_dirty_rects:
+                        decode_scale = 1
+                    for frame_data in payloads:
+                        frame = self.decode_frame(frame_data, decode_scale)
+                    self.release_buffers(payloads)
                 
-                # Decode the frame
-                nparr = np.frombuffer(frame_data, np.uint8)
-                frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-                
-                if frame is not None:
-                    original_height, original_width = frame.shape[:2]
+                    if frame is not None:
+                        frame_height, frame_width = frame.shape[:2]
+                        original_height = frame_height * self.frame_scale
+                        original_width = frame_width * self.frame_scale
+                        stream_size = (original_width, original_height)
                     
-                    # Create window with proper sizing on first frame
-                    if not window_created:
-                        cv2.namedWindow('Screen Share - Server', cv2.WINDOW_NORMAL)
-                        
-                        # Get screen dimensions for smart initial sizing
-                        try:
-                            import tkinter as tk
-                            root = tk.Tk()
-                            screen_width = root.winfo_screenwidth()
-                            screen_height = root.winfo_screenheight()
-                            root.destroy()
+                        # Size the window properly on the first frame
+                        if not window_sized:
+                            # Get screen dimensions for smart initial sizing
+                            screen_size = get_screen_size()
+                            if screen_size is not None:
+                                screen_width, screen_height = screen_size
                             
-                            # Calculate initial window size (80% of screen size max)
-                            max_display_width = int(screen_width * 0.8)
-                            max_display_height = int(screen_height * 0.8)
+                                # Calculate initial window size (80% of screen size max)
+                                max_display_width = int(screen_width * 0.8)
+                                max_display_height = int(screen_height * 0.8)
                             
-                            # Scale frame to fit screen while maintaining aspect ratio
-                            scale_w = max_display_width / original_width
-                            scale_h = max_display_height / original_height
-                            scale = min(scale_w, scale_h, 1.0)  # Don't upscale
+                                # Scale frame to fit screen while maintaining aspect ratio
+                                scale_w = max_display_width / original_width
+                                scale_h = max_display_height / original_height
+                                scale = min(scale_w, scale_h, 1.0)  # Don't upscale
                             
-                            display_width = int(original_width * scale)
-                            display_height = int(original_height * scale)
+                                display_width = int(original_width * scale)
+                                display_height = int(original_height * scale)
                             
-                            cv2.resizeWindow('Screen Share - Server', display_width, display_height)
-                            print(f"Window sized to {display_width}x{display_height} (scale: {scale:.2f})")
-                            print(f"Original stream: {original_width}x{original_height}")
+                                print(f"Window sized to {display_width}x{display_height} (scale: {scale:.2f})")
+                                print(f"Original stream: {original_width}x{original_height}")
                             
-                        except ImportError:
-                            # Fallback if tkinter not available
-                            cv2.resizeWindow('Screen Share - Server', min(1200, original_width), min(800, original_height))
-                            print(f"Stream resolution: {original_width}x{original_height}")
+                            else:
+                                # Fallback if the screen size is unknown
+                                display_width = min(DEFAULT_WINDOW_SIZE[0], original_width)
+                                display_height = min(DEFAULT_WINDOW_SIZE[1], original_height)
+                                print(f"Stream resolution: {original_width}x{original_height}")
                         
-                        window_created = True
-                    
-                    # Handle different display modes
-                    display_frame = frame
-                    if fit_to_screen:
-                        # Get current window size
-                        try:
-                            # This is a workaround since OpenCV doesn't provide direct window size access
-                            window_rect = cv2.getWindowImageRect('Screen Share - Server')
-                            if window_rect[2] > 0 and window_rect[3] > 0:
-                                display_frame = cv2.resize(frame, (window_rect[2], window_rect[3]), 
-                                                         interpolation=cv2.INTER_LINEAR)
-                        except:
-                            pass  # Use original frame if resize fails
+                            if gl_display is not None:
+                                gl_display.resize(display_width, display_height)
+                            else:
+                                cv2.resizeWindow('Screen Share - Server', display_width, display_height)
+                            window_sized = True
                     
-                    # Display the frame
-                    cv2.imshow('Screen Share - Server', display_frame)
+                        # Handle different display modes
+                        display_frame = frame
+                        if gl_display is not None:
+                            # The GPU scales to the window while drawing (stretched in
+                            # fit mode, letterboxed otherwise), so there is no CPU
+                            # resize; the size only steers reduced decoding
+                            if fit_to_screen:
+                                window_size = gl_display.window_size()
+                        elif fit_to_screen:
+                            # Get current window size
+                            try:
+                                # This is a workaround since OpenCV doesn't provide direct window size access.
+                                # The window rarely changes, so only poll it every few frames
+                                if window_size is None or frames_shown % WINDOW_RECT_INTERVAL == 0:
+                                    window_rect = cv2.getWindowImageRect('Screen Share - Server')
+                                    if window_rect[2] > 0 and window_rect[3] > 0:
+                                        window_size = (window_rect[2], window_rect[3])
+                            
+                                if window_size is not None and window_size != (frame_width, frame_height):
+                                    width, height = window_size
+                                    if resize_buf is None or resize_buf.shape != (height, width) + frame.shape[2:]:
+                                        resize_buf = np.empty((height, width) + frame.shape[2:], frame.dtype)
+                                    display_frame = self.resize_to_window(frame, window_size, resize_buf)
+                            except:
+                                pass  # Use original frame if resize fails
+                        frames_shown += 1
                     
-                    # Handle key presses
+                        # Display the frame
+                        if gl_display is not None:
+                            gl_display.show(display_frame, stretch=fit_to_screen)
+                        else:
+                            cv2.imshow('Screen Share - Server', display_frame)
+                    elif not self.waiting_for_keyframe:
+                        print("Failed to decode frame")
+                
+                # Handle key presses. This also runs while idle: a static screen
+                # sends dirty-rect streams almost nothing between keyframes
+                if gl_display is not None:
+                    key = gl_display.poll_key()
+                else:
                     key = cv2.waitKey(1) & 0xFF
-                    if key == ord('q'):
-                        print("Quit key pressed")
-                        break
-                    elif key == ord('f'):
-                        # Toggle fullscreen
+                
+                if key == ord('q'):
+                    print("Quit key pressed")
+                    break
+                elif key == ord('f'):
+                    # Toggle fullscreen
+                    if gl_display is not None:
+                        gl_display.set_fullscreen()
+                    else:
                         cv2.setWindowProperty('Screen Share - Server', cv2.WND_PROP_FULLSCREEN, 
                                             cv2.WINDOW_FULLSCREEN)
-                        print("Switched to fullscreen mode")
-                    elif key == ord('s'):
-                        # Toggle fit to screen
-                        fit_to_screen = not fit_to_screen
-                        if fit_to_screen:
-                            print("Fit to screen mode enabled")
-                        else:
-                            print("Original size mode enabled")
-                    elif key == ord('r'):
-                        # Reset window size
+                    print("Switched to fullscreen mode")
+                elif key == ord('s'):
+                    # Toggle fit to screen
+                    fit_to_screen = not fit_to_screen
+                    window_size = None
+                    if fit_to_screen:
+                        print("Fit to screen mode enabled")
+                    else:
+                        print("Original size mode enabled")
+                elif key == ord('r') and stream_size is not None:
+                    # Reset window size
+                    original_width, original_height = stream_size
+                    if gl_display is not None:
+                        gl_display.reset(original_width, original_height)
+                    else:
                         cv2.setWindowProperty('Screen Share - Server', cv2.WND_PROP_FULLSCREEN, 
                                             cv2.WINDOW_NORMAL)
                         cv2.resizeWindow('Screen Share - Server', original_width, original_height)
-                        fit_to_screen = False
-                        print(f"Reset to original size: {original_width}x{original_height}")
-                else:
-                    print("Failed to decode frame")
+                    fit_to_screen = False
+                    print(f"Reset to original size: {original_width}x{original_height}")
                     
         except KeyboardInterrupt:
             print("\nStopping server...")
         except Exception as e:
             print(f"Display error: {e}")
         finally:
+            if gl_display is not None:
+                gl_display.close()
             self.stop_receiving()
     
     def stop_receiving(self):
         """Stop receiving and clean up"""
         self.receiving = False
+        self.h264_decoder = None
+        self.canvas = None
+        self.reduced_keyframe = None
+        self.waiting_for_keyframe = False
+        self.saw_dirty_rects = False
+        with self.payload_lock:
+            self.pending_payloads = []
+            self.backlog_count = 0
+        self.pending_frames = {}
+        self.last_frame_id = -1
         cv2.destroyAllWindows()
         
         if self.client_socket:
@@ -254,6 +943,13 @@ def main():
             if port < 1024 or port > 65535:
                 print("Port must be between 1024 and 65535")
                 continue
+            
+            transport = input("Transport (1=TCP, 2=UDP with FEC, default 1): ").strip()
+            server.use_udp = transport == "2"
+            
+            if glfw is not None and moderngl is not None:
+                gl = input("Display through OpenGL? (y/n, default n): ").strip().lower()
+                server.use_gl = gl == 'y'
                 
             break
         except ValueError: